@@ -32,6 +32,7 @@ def run_bot() -> None:
         .concurrent_updates(True)
         .rate_limiter(AIORateLimiter(overall_max_rate=10, overall_time_period=1, max_retries=5))
         .post_init(tu.post_init)
+        .post_shutdown(tu.post_shutdown)
         .build()
     )
 
@@ -23,6 +23,21 @@ sorry_noreply = config_yaml["SORRY_NOREPLY"]
 
 mongodb_uri = f"mongodb://mongo:{config_env['MONGODB_PORT']}"
 mongodb_database = config_env['MONGODB_DATABASE']
+mongodb_client_options = {
+    "maxPoolSize": config_yaml.get("MONGODB_MAX_POOL_SIZE", 100),
+    "minPoolSize": config_yaml.get("MONGODB_MIN_POOL_SIZE", 0),
+    "compressors": config_yaml.get("MONGODB_COMPRESSORS") or None,
+    "connectTimeoutMS": config_yaml.get("MONGODB_CONNECT_TIMEOUT_MS", 20000),
+    "serverSelectionTimeoutMS": config_yaml.get("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 30000),
+    "socketTimeoutMS": config_yaml.get("MONGODB_SOCKET_TIMEOUT_MS"),
+    "waitQueueTimeoutMS": config_yaml.get("MONGODB_WAIT_QUEUE_TIMEOUT_MS"),
+    "readPreference": config_yaml.get("MONGODB_READ_PREFERENCE", "primary"),
+}
+db_metrics_log_seconds = config_yaml.get("DB_METRICS_LOG_SECONDS", 300)
+subscriber_cache_size = config_yaml.get("SUBSCRIBER_CACHE_SIZE", 10000)
+subscriber_cache_ttl = config_yaml.get("SUBSCRIBER_CACHE_TTL", 60)
+usage_flush_size = config_yaml.get("USAGE_FLUSH_SIZE", 1000)
+usage_flush_seconds = config_yaml.get("USAGE_FLUSH_SECONDS", 5)
 
 base_server = config_yaml["MY_SERVER"]
 
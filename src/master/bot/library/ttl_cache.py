@@ -0,0 +1,68 @@
+import time
+from collections import OrderedDict
+from typing import Any, Hashable
+
+
+class TTLCache:
+    """
+    In-process cache of dict entries bounded by size and age.
+
+    Entries expire `ttl` seconds after they were last written. Once more than `max_entries` entries are
+    held, the least recently used one is evicted. `max_entries` of 0 disables the cache.
+
+    Notes:
+    - Not shared between processes, writes made by another process are seen once the entry expired.
+    """
+
+    def __init__(self, max_entries: int, ttl: float):
+        self.__max_entries = max_entries
+        self.__ttl = ttl
+        self.__entries: OrderedDict[Hashable, tuple[float, dict]] = OrderedDict()
+        self.__hits = 0
+        self.__misses = 0
+
+    @property
+    def hits(self) -> int:
+        return self.__hits
+
+    @property
+    def misses(self) -> int:
+        return self.__misses
+
+    def __len__(self) -> int:
+        return len(self.__entries)
+
+    def get(self, key: Hashable, fields: tuple[str, ...]) -> dict | None:
+        """
+        Return the cached entry if it holds every field in `fields`, else None. Counts a hit or a miss.
+        """
+        item = self.__entries.get(key)
+        if item is not None:
+            expire_at, entry = item
+            if expire_at <= time.monotonic():
+                del self.__entries[key]
+            elif all(field in entry for field in fields):
+                self.__entries.move_to_end(key)
+                self.__hits += 1
+                return entry
+        self.__misses += 1
+        return None
+
+    def set(self, key: Hashable, entry: dict) -> None:
+        if self.__max_entries <= 0:
+            return None
+        self.__entries[key] = (time.monotonic() + self.__ttl, dict(entry))
+        self.__entries.move_to_end(key)
+        while len(self.__entries) > self.__max_entries:
+            self.__entries.popitem(last=False)
+
+    def update(self, key: Hashable, fields: dict[str, Any]) -> None:
+        """
+        Write `fields` into the entry if it is cached, the expiry of the entry is left unchanged.
+        """
+        item = self.__entries.get(key)
+        if item is not None:
+            item[1].update(fields)
+
+    def invalidate(self, key: Hashable) -> None:
+        self.__entries.pop(key, None)
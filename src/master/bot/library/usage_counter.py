@@ -0,0 +1,81 @@
+import asyncio
+import logging
+from typing import Awaitable, Callable, Hashable
+
+logger = logging.getLogger(__name__)
+
+
+class UsageCounter:
+    """
+    Aggregate counter increments in memory and hand them to `write_fn` in batches.
+
+    Increments of the same (owner, key) are summed. The pending increments are flushed `max_delay` seconds
+    after the first one arrived or once `max_size` (owner, key) pairs are pending, whichever comes first.
+    `close` flushes whatever is left and must be awaited before the process exits.
+
+    Notes:
+    - `write_fn` receives {owner: {key: increment}} and is expected to apply it with one bulk write.
+    - Increments of a failed flush are kept and retried with the next one.
+    - Increments still pending when the process dies are lost.
+    """
+
+    def __init__(
+            self, write_fn: Callable[[dict[Hashable, dict[str, int]]], Awaitable[int]],
+            max_size: int = 1000, max_delay: float = 5.0
+    ):
+        assert max_size > 0, "max_size must be positive"
+        self.__write_fn = write_fn
+        self.__max_size = max_size
+        self.__max_delay = max_delay
+        self.__pending: dict[tuple[Hashable, str], int] = dict()
+        self.__lock = asyncio.Lock()
+        self.__timer: asyncio.Task | None = None
+
+    def __len__(self) -> int:
+        return len(self.__pending)
+
+    async def __flush_later(self, delay: float) -> None:
+        await asyncio.sleep(delay)
+        self.__timer = None
+        try:
+            await self.flush()
+        except Exception as err:
+            logger.error(f"[UsageCounter] => flush failed, {len(self.__pending)} pending: {err}")
+
+    def __schedule(self, delay: float) -> None:
+        if self.__timer is not None:
+            self.__timer.cancel()
+        self.__timer = asyncio.ensure_future(self.__flush_later(delay))
+
+    def tick(self, owner: Hashable, key: str, n: int = 1) -> None:
+        """
+        Record an increment, never waits for the DB.
+        """
+        self.__pending[(owner, key)] = self.__pending.get((owner, key), 0) + n
+        if len(self.__pending) >= self.__max_size:
+            self.__schedule(0)
+        elif self.__timer is None:
+            self.__schedule(self.__max_delay)
+
+    async def flush(self) -> int:
+        async with self.__lock:
+            if len(self.__pending) == 0:
+                return 0
+            batch, self.__pending = self.__pending, dict()
+            increments: dict[Hashable, dict[str, int]] = dict()
+            for (owner, key), n in batch.items():
+                increments.setdefault(owner, dict())[key] = n
+            try:
+                return await self.__write_fn(increments)
+            except Exception:
+                for pair, n in batch.items():
+                    self.__pending[pair] = self.__pending.get(pair, 0) + n
+                if self.__timer is None:
+                    self.__schedule(self.__max_delay)
+                raise
+
+    async def close(self) -> int:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        return await self.flush()
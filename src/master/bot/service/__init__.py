@@ -1,14 +1,26 @@
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
-from . import subscriber_service
+import pymongo
+from . import subscriber_service, counter_service, feedback_service, mongo_client
 
-COLLECTIONS_NAME = ["subscriber"]
+logger = logging.getLogger(__name__)
+
+COLLECTIONS_NAME = ["subscriber", counter_service.COUNTER_COLLECTION, feedback_service.FEEDBACK_COLLECTION]
 
 
 class ServiceFactory:
-    def __init__(self, db_uri: str, bot_id: int = None, database_name: str = ""):
-        self.__client = AsyncIOMotorClient(db_uri)
+    def __init__(
+            self, db_uri: str, bot_id: int = None, database_name: str = "",
+            subscriber_cache_size: int = 0, subscriber_cache_ttl: float = 60.0,
+            usage_flush_size: int = 1000, usage_flush_seconds: float = 5.0, client_options: dict | None = None
+    ):
+        self.__client: AsyncIOMotorClient = mongo_client.get_client(db_uri, client_options)
         self.__db: AsyncIOMotorDatabase = self.__client[database_name]
         self.__bot_id = bot_id
+        self.__subscriber_cache_size = subscriber_cache_size
+        self.__subscriber_cache_ttl = subscriber_cache_ttl
+        self.__usage_flush_size = usage_flush_size
+        self.__usage_flush_seconds = usage_flush_seconds
 
     def get_collection(self, collection_name: str) -> AsyncIOMotorCollection:
         if collection_name not in COLLECTIONS_NAME:
@@ -18,5 +30,34 @@ class ServiceFactory:
 
     def get_service(self, service_name: str):
         if service_name == "subscriber":
-            return subscriber_service.SubscriberService(self.get_collection(service_name))
+            return subscriber_service.SubscriberService(
+                self.get_collection(service_name), self.__subscriber_cache_size, self.__subscriber_cache_ttl,
+                self.get_service(counter_service.COUNTER_COLLECTION), self.__usage_flush_size,
+                self.__usage_flush_seconds
+            )
+        elif service_name == counter_service.COUNTER_COLLECTION:
+            return counter_service.CounterService(self.get_collection(service_name))
+        elif service_name == feedback_service.FEEDBACK_COLLECTION:
+            return feedback_service.FeedbackService(self.get_collection(service_name))
         return None
+
+    async def ensure_indexes(self) -> None:
+        """
+        Create the indexes of every collection, safe to call at every start.
+
+        Notes:
+        - A collection whose indexes cannot be built (e.g. duplicates under a unique index) is logged and
+          skipped, its queries fall back to collection scans.
+        """
+        for collection_name in COLLECTIONS_NAME:
+            try:
+                await self.get_service(collection_name).ensure_indexes()
+            except pymongo.errors.OperationFailure as err:
+                logger.error(f"[ensure_indexes] => collection: {collection_name}, error: {err}")
+
+    @staticmethod
+    def driver_metrics() -> dict:
+        """
+        Connection pool and command counters of the MongoDB client of this process, see `DriverMetrics`.
+        """
+        return mongo_client.metrics.snapshot()
@@ -0,0 +1,42 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+
+COUNTER_COLLECTION = "subscriber_counter"
+
+
+class CounterService:
+    """
+    Number of subscribers per status, one document per status, shared with the worker bot.
+
+    The counters are moved by whichever service changes the status of a subscriber, the worker bot
+    periodically recomputes them from the subscriber collection.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        # Counters are looked up by _id only
+        return None
+
+    async def get(self, status: str) -> int | None:
+        """
+        Returns:
+            int | None: the counter of `status`, None if it was never set
+        """
+        document = await self.__collection.find_one({"_id": status}, {"count": 1})
+        if document is None:
+            return None
+        return document["count"]
+
+    async def increment(self, changes: dict[str, int]) -> None:
+        """
+        Move the counters atomically by `changes`, a delta per status.
+        """
+        requests = [
+            pymongo.UpdateOne({"_id": status}, {"$inc": {"count": delta}}, upsert=True)
+            for status, delta in changes.items() if delta != 0
+        ]
+        if len(requests) == 0:
+            return None
+        await self.__collection.bulk_write(requests, ordered=False)
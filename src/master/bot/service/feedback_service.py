@@ -0,0 +1,33 @@
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+
+FEEDBACK_COLLECTION = "feedback"
+
+
+class FeedbackService:
+    """
+    Feedback messages of subscribers, one document per message, shared with the worker bot.
+
+    Notes:
+    - Append-only, a message is stored with a single insert and never rewritten.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        # Serves the feedback of a subscriber, newest first
+        await self.__collection.create_index(
+            [("telegram_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="telegram_id_created_at"
+        )
+        # Serves exports by date
+        await self.__collection.create_index("created_at", name="created_at")
+
+    async def add(self, telegram_id: int, username: str | None, message: str) -> None:
+        await self.__collection.insert_one({
+            "telegram_id": telegram_id,
+            "username": username,
+            "message": message,
+            "created_at": datetime.now(),
+        })
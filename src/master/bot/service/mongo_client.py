@@ -0,0 +1,136 @@
+import threading
+from motor.motor_asyncio import AsyncIOMotorClient
+from pymongo import monitoring
+
+# One client, hence one connection pool, per process and URI
+_clients: dict[str, AsyncIOMotorClient] = dict()
+_lock = threading.Lock()
+
+
+class DriverMetrics(monitoring.CommandListener, monitoring.ConnectionPoolListener):
+    """
+    Count the commands and connection pool events reported by the driver.
+
+    Notes:
+    - Events are reported from the driver's threads, counters are guarded by a lock.
+    - `snapshot` is cheap, it only copies the counters.
+    """
+
+    def __init__(self):
+        self.__lock = threading.Lock()
+        self.__commands: dict[str, dict] = dict()
+        self.__pool = {
+            "created": 0, "closed": 0, "checked_out": 0, "max_checked_out": 0,
+            "checkout_failed": 0, "cleared": 0,
+        }
+        self.__pending_checkouts = 0
+        self.__max_pending_checkouts = 0
+
+    def __command(self, name: str) -> dict:
+        stats = self.__commands.get(name)
+        if stats is None:
+            stats = {"started": 0, "succeeded": 0, "failed": 0, "total_ms": 0.0, "max_ms": 0.0}
+            self.__commands[name] = stats
+        return stats
+
+    def __finished(self, event, outcome: str) -> None:
+        duration_ms = event.duration_micros / 1000
+        with self.__lock:
+            stats = self.__command(event.command_name)
+            stats[outcome] += 1
+            stats["total_ms"] += duration_ms
+            stats["max_ms"] = max(stats["max_ms"], duration_ms)
+
+    def started(self, event: monitoring.CommandStartedEvent) -> None:
+        with self.__lock:
+            self.__command(event.command_name)["started"] += 1
+
+    def succeeded(self, event: monitoring.CommandSucceededEvent) -> None:
+        self.__finished(event, "succeeded")
+
+    def failed(self, event: monitoring.CommandFailedEvent) -> None:
+        self.__finished(event, "failed")
+
+    def pool_created(self, event) -> None:
+        pass
+
+    def pool_ready(self, event) -> None:
+        pass
+
+    def pool_cleared(self, event) -> None:
+        with self.__lock:
+            self.__pool["cleared"] += 1
+
+    def pool_closed(self, event) -> None:
+        pass
+
+    def connection_created(self, event) -> None:
+        with self.__lock:
+            self.__pool["created"] += 1
+
+    def connection_ready(self, event) -> None:
+        pass
+
+    def connection_closed(self, event) -> None:
+        with self.__lock:
+            self.__pool["closed"] += 1
+
+    def connection_check_out_started(self, event) -> None:
+        with self.__lock:
+            self.__pending_checkouts += 1
+            self.__max_pending_checkouts = max(self.__max_pending_checkouts, self.__pending_checkouts)
+
+    def connection_check_out_failed(self, event) -> None:
+        with self.__lock:
+            self.__pending_checkouts -= 1
+            self.__pool["checkout_failed"] += 1
+
+    def connection_checked_out(self, event) -> None:
+        with self.__lock:
+            self.__pending_checkouts -= 1
+            self.__pool["checked_out"] += 1
+            self.__pool["max_checked_out"] = max(self.__pool["max_checked_out"], self.__pool["checked_out"])
+
+    def connection_checked_in(self, event) -> None:
+        with self.__lock:
+            self.__pool["checked_out"] -= 1
+
+    def snapshot(self) -> dict:
+        """
+        Returns:
+            dict: with
+                - pool (dict): connections created, closed and checked out (now and at most),
+                  failed checkouts, pool clears, checkouts waiting for a connection (now and at most)
+                - commands (dict[str, dict]): per command name, number started, succeeded and failed,
+                  total and max duration in milliseconds
+        """
+        with self.__lock:
+            pool = dict(self.__pool)
+            pool["waiting"] = self.__pending_checkouts
+            pool["max_waiting"] = self.__max_pending_checkouts
+            commands = {name: dict(stats) for name, stats in self.__commands.items()}
+        return {"pool": pool, "commands": commands}
+
+
+metrics = DriverMetrics()
+
+
+def get_client(db_uri: str, client_options: dict | None = None) -> AsyncIOMotorClient:
+    """
+    Return the client of `db_uri` shared by every service of this process, created on first use.
+
+    Args:
+        db_uri (str): MongoDB connection string
+        client_options (dict | None): keyword options of the client, e.g. maxPoolSize, compressors,
+            readPreference, only used when the client is created
+
+    Notes:
+        - Every client reports to `metrics`.
+    """
+    with _lock:
+        client = _clients.get(db_uri)
+        if client is None:
+            options = {key: value for key, value in (client_options or dict()).items() if value is not None}
+            client = AsyncIOMotorClient(db_uri, event_listeners=[metrics], **options)
+            _clients[db_uri] = client
+        return client
@@ -1,7 +1,15 @@
 from dataclasses import dataclass
 from typing import Any
 from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+from pymongo import ReturnDocument
 from datetime import datetime
+from library.ttl_cache import TTLCache
+from library.usage_counter import UsageCounter
+from .counter_service import CounterService
+
+# Read on nearly every update and rarely written, kept in the cache
+CACHED_FIELDS = ("mode", "status", "username")
 
 
 @dataclass
@@ -29,10 +37,34 @@ class Subscriber:
 
 
 class SubscriberService:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    """
+    Notes:
+    - `CACHED_FIELDS` of recently seen subscribers are cached in process for `cache_ttl` seconds, writes
+      through this service update the cache, writes by the worker bot are seen once the entry expired.
+    - Status changes made through this service move the per-status counters of `counter_service`.
+    - `tick_usage` increments are buffered and written behind every `usage_flush_seconds` seconds, `close`
+      writes the pending ones.
+    """
+
+    def __init__(
+            self, collection: AsyncIOMotorCollection, cache_size: int = 0, cache_ttl: float = 60.0,
+            counter_service: CounterService | None = None, usage_flush_size: int = 1000,
+            usage_flush_seconds: float = 5.0
+    ):
         self.__collection = collection
+        self.__cache = TTLCache(cache_size, cache_ttl)
+        self.__counter_service = counter_service
+        self.__usage = UsageCounter(self.bulk_increment, usage_flush_size, usage_flush_seconds)
+
+    def cache_stats(self) -> dict:
+        return {"hits": self.__cache.hits, "misses": self.__cache.misses, "size": len(self.__cache)}
+
+    def __cache_document(self, document: dict) -> None:
+        self.__cache.set(document["telegram_id"], {field: document.get(field) for field in CACHED_FIELDS})
 
     async def exists(self, subscriber_id: int, raise_exception: bool = False) -> bool:
+        if self.__cache.get(subscriber_id, ()) is not None:
+            return True
         count: int = await self.__collection.count_documents({"telegram_id": subscriber_id})
         if count > 0:
             return True
@@ -40,6 +72,14 @@ class SubscriberService:
             raise ValueError(f"{subscriber_id} does not exists")
         return False
 
+    async def ensure_indexes(self) -> None:
+        # Serves `get_all` and `get_count`, shared with the worker bot
+        await self.__collection.create_index(
+            [("status", pymongo.ASCENDING), ("telegram_id", pymongo.ASCENDING)], name="status_telegram_id"
+        )
+        # Serves every lookup by subscriber
+        await self.__collection.create_index("telegram_id", name="telegram_id", unique=True)
+
     async def get_all(self, target_status: str, skip: int, limit: int):
         find_cursor = self.__collection.find(
             {"status": target_status}, {"_id": 0}, skip=skip, limit=limit
@@ -52,52 +92,102 @@ class SubscriberService:
     async def set_attribute(
             self, sub_id: int, _key: str | None = None, _value: Any | None = None, **key_value_pair
     ) -> int:
-        await self.exists(sub_id, True)
         # TODO Detect invalid key
-        if _key is None or _value is None:               
-            result = await self.__collection.update_one(
-                {'telegram_id': sub_id},
-                {'$set': key_value_pair}
-            )
-            return result.modified_count
-        else:
-            result = await self.__collection.update_one(
-                {'telegram_id': sub_id},
-                {'$set': {_key: _value}}
-            )
-            return result.modified_count
+        if _key is not None and _value is not None:
+            key_value_pair = {_key: _value}
+        # The document before the update tells whether the status changed
+        before = await self.__collection.find_one_and_update(
+            {'telegram_id': sub_id},
+            {'$set': key_value_pair},
+            projection={"_id": 0, **{key: 1 for key in key_value_pair}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            self.__cache.invalidate(sub_id)
+            raise ValueError(f"{sub_id} does not exists")
+        self.__cache.update(sub_id, {key: value for key, value in key_value_pair.items() if key in CACHED_FIELDS})
+        await self.__count_status_change(before, key_value_pair)
+        return int(any(before.get(key) != value for key, value in key_value_pair.items()))
+
+    async def __count_status_change(self, before: dict, key_value_pair: dict) -> None:
+        if self.__counter_service is None or "status" not in key_value_pair:
+            return None
+        old_status, new_status = before.get("status"), key_value_pair["status"]
+        if old_status == new_status:
+            return None
+        changes = {new_status: 1}
+        if old_status is not None:
+            changes[old_status] = -1
+        await self.__counter_service.increment(changes)
 
     async def clear_task_log(self, task_hash: str) -> int:
         update_result = await self.__collection.update_many(filter={}, update={"$set": {task_hash: 0}})
         return update_result.modified_count
 
     async def get_attribute(self, sub_id: int, key: str) -> Any | None:
-        await self.exists(sub_id, True)
-        document = await self.__collection.find_one(
-            {"telegram_id": sub_id}, {key: 1}
-        )
-        if document:
-            if key in document:
-                return document[key]
-        return None
+        document = await self.get_attributes(sub_id, key)
+        if document is None:
+            raise ValueError(f"{sub_id} does not exists")
+        return document.get(key)
+
+    async def get_attributes(self, sub_id: int, *keys: str) -> dict | None:
+        """
+        Fetch several fields of a subscriber in one query.
+
+        `CACHED_FIELDS` are served from the cache when possible, a query also reads them to refresh the cache.
+
+        Returns:
+            dict | None: the requested fields the subscriber has, None if the subscriber does not exist
+        """
+        if all(key in CACHED_FIELDS for key in keys):
+            entry = self.__cache.get(sub_id, keys)
+            if entry is not None:
+                document = {key: entry[key] for key in keys if entry[key] is not None}
+                document["telegram_id"] = sub_id
+                return document
+        projection = {"_id": 0, "telegram_id": 1}
+        for key in keys + CACHED_FIELDS:
+            projection[key] = 1
+        document = await self.__collection.find_one({"telegram_id": sub_id}, projection)
+        if document is None:
+            return None
+        self.__cache_document(document)
+        return {key: value for key, value in document.items() if key == "telegram_id" or key in keys}
 
     async def tick_usage(self, user_id: int, key: str) -> int:
-        await self.exists(user_id, True)
-        current_value = await self.get_attribute(user_id, key)
-        if current_value:
-            update_result = await self.__collection.update_one({"telegram_id": user_id}, {"$inc": {key: 1}})
-            return update_result.modified_count
-
-        result = await self.__collection.update_one(
-            {'telegram_id': user_id},
-            {'$set': {
-                key: 1
-            }}
+        """
+        Increment the `key` counter of a subscriber, written to the DB with the next usage flush.
+        """
+        self.__usage.tick(user_id, key)
+        return 1
+
+    async def bulk_increment(self, increments: dict[int, dict[str, int]]) -> int:
+        """
+        Apply {telegram_id: {key: increment}} with one unordered bulk write, $inc starts missing counters.
+
+        Notes:
+        - Subscribers are never upserted, increments of a subscriber that does not exist are dropped.
+        """
+        if len(increments) == 0:
+            return 0
+        result = await self.__collection.bulk_write(
+            [pymongo.UpdateOne({"telegram_id": sub_id}, {"$inc": counters}) for sub_id, counters in increments.items()],
+            ordered=False
         )
         return result.modified_count
 
+    async def close(self) -> None:
+        await self.__usage.close()
+
     async def add(self, subscriber: Subscriber) -> None:
         is_exists: bool = await self.exists(subscriber.tel_id, False)
         if is_exists:
             return None
-        await self.__collection.insert_one(subscriber.to_dict())
+        try:
+            await self.__collection.insert_one(subscriber.to_dict())
+        except pymongo.errors.DuplicateKeyError:
+            # Registered concurrently
+            return None
+        self.__cache_document(subscriber.to_dict())
+        if self.__counter_service is not None:
+            await self.__counter_service.increment({subscriber.status: 1})
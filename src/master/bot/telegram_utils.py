@@ -1,4 +1,5 @@
 import asyncio
+import json
 import logging
 import random as rn
 import re
@@ -18,12 +19,21 @@ from const import *
 from library.validation import check_and_update_quota
 from service import ServiceFactory
 
-sf = ServiceFactory(cfg.mongodb_uri, database_name=cfg.mongodb_database)
+sf = ServiceFactory(
+    cfg.mongodb_uri, database_name=cfg.mongodb_database,
+    subscriber_cache_size=cfg.subscriber_cache_size, subscriber_cache_ttl=cfg.subscriber_cache_ttl,
+    usage_flush_size=cfg.usage_flush_size, usage_flush_seconds=cfg.usage_flush_seconds,
+    client_options=cfg.mongodb_client_options
+)
 
 subscriber_service: service.subscriber_service.SubscriberService = sf.get_service("subscriber")
+feedback_service: service.feedback_service.FeedbackService = sf.get_service("feedback")
 
 logger = logging.getLogger(__name__)
 
+# Background maintenance tasks, cancelled in `post_shutdown`
+background_tasks: set[asyncio.Task] = set()
+
 available_commands = [
     ("/follow", "👉 Follow me on GitHub"),
     ("/feedback", "✉️ Provide feedback"),
@@ -46,15 +56,15 @@ async def help_handler(update: Update, context: CallbackContext):
             None
     """
     subscriber: TgUser = update.message.from_user
-    is_exists: bool = await subscriber_service.exists(subscriber.id, False)
-    if not is_exists:
+    document: dict | None = await subscriber_service.get_attributes(subscriber.id, "mode")
+    if document is None:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /start to continue.",
             parse_mode=ParseMode.HTML
         )
         return None
 
-    mode: str = await subscriber_service.get_attribute(subscriber.id, "mode")
+    mode: str | None = document.get("mode")
     if mode != MODE_SUBSCRIBED:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /subscribe to continue.",
@@ -80,8 +90,39 @@ async def post_init(application: TgApplication) -> None:
 
     Steps:
     1. Set the available commands
+    2. Create the DB indexes
+    3. Start logging the MongoDB driver metrics
     """
     await application.bot.set_my_commands(available_commands)
+    await sf.ensure_indexes()
+    if cfg.db_metrics_log_seconds > 0:
+        background_tasks.add(asyncio.create_task(log_driver_metrics()))
+
+
+async def log_driver_metrics() -> None:
+    """
+    Log the connection pool and command counters of the MongoDB client as one JSON line every
+    `cfg.db_metrics_log_seconds` seconds, for the monitoring to scrape.
+    """
+    while True:
+        await asyncio.sleep(cfg.db_metrics_log_seconds)
+        logger.info(f"[DB_METRICS] => {json.dumps(sf.driver_metrics())}")
+
+
+async def post_shutdown(application: TgApplication) -> None:
+    """
+    Asynchronous handler to clean up before the bot exits.
+
+    Steps:
+    1. Stop the background tasks
+    2. Write the buffered usage counters
+    """
+    for task in background_tasks:
+        task.cancel()
+    try:
+        await subscriber_service.close()
+    except Exception as e:
+        logger.error(f"[post_shutdown] => {str(e)}")
 
 
 async def register_user_if_not_exists(
@@ -131,8 +172,8 @@ async def unsubscribe_handler(update: Update, context: CallbackContext) -> None:
 async def message_handler(update: Update, context: CallbackContext) -> None:
     """This is triggered whenever subscriber send text directly to the bot"""
     subscriber: TgUser = update.message.from_user
-    is_exists: bool = await subscriber_service.exists(subscriber.id, False)
-    if not is_exists:
+    document: dict | None = await subscriber_service.get_attributes(subscriber.id, "mode")
+    if document is None:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /start to continue.",
             parse_mode=ParseMode.HTML
@@ -140,7 +181,7 @@ async def message_handler(update: Update, context: CallbackContext) -> None:
         return None
 
     message = update.message.text
-    mode: str = await subscriber_service.get_attribute(subscriber.id, "mode")
+    mode: str | None = document.get("mode")
     if mode not in [MODE_SUBSCRIBE, MODE_FEEDBACK]:
         await update.message.reply_text(cfg.sorry_noreply, parse_mode=ParseMode.HTML)
         return None
@@ -240,15 +281,15 @@ async def start_handler(update: Update, context: CallbackContext):
 async def get_follow_information_handler(update: Update, context: CallbackContext) -> None:
     """Send subscribers the urls to our social media platform."""
     subscriber: TgUser = update.message.from_user
-    is_exists: bool = await subscriber_service.exists(subscriber.id, False)
-    if not is_exists:
+    document: dict | None = await subscriber_service.get_attributes(subscriber.id, "mode")
+    if document is None:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /start to continue.",
             parse_mode=ParseMode.HTML
         )
         return None
 
-    mode: str = await subscriber_service.get_attribute(subscriber.id, "mode")
+    mode: str | None = document.get("mode")
     if mode != MODE_SUBSCRIBED:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /subscribe to continue.",
@@ -280,15 +321,15 @@ Thank you.  Finally, this program is currently not capable of processing photos,
 async def start_feedback_handler(update: Update, context: CallbackContext) -> None:
     """Set bot to accept subscriber's feedback."""
     subscriber: TgUser = update.message.from_user
-    is_exists: bool = await subscriber_service.exists(subscriber.id, False)
-    if not is_exists:
+    document: dict | None = await subscriber_service.get_attributes(subscriber.id, "mode")
+    if document is None:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /start to continue.",
             parse_mode=ParseMode.HTML
         )
         return None
 
-    mode: str = await subscriber_service.get_attribute(subscriber.id, "mode")
+    mode: str | None = document.get("mode")
     if mode != MODE_SUBSCRIBED:
         output_message = "You are not subscribed to this Bot. Please click /subscribe to continue."
     else:
@@ -298,20 +339,28 @@ async def start_feedback_handler(update: Update, context: CallbackContext) -> No
     return None
 
 
+MAX_FEEDBACK_LENGTH = 2048
+
+
 async def feedback(update: Update):
-    await subscriber_service.tick_usage(update.message.from_user.id, "n_feedback")
-    user_id = update.message.from_user.id
+    """
+    Store the feedback message of a subscriber and switch them back to the subscribed mode.
 
-    original_msg: str = await subscriber_service.get_attribute(user_id, "feedback")
+    Notes:
+        - Each message is inserted into the feedback collection on its own, messages longer than
+          `MAX_FEEDBACK_LENGTH` are refused.
+    """
+    subscriber: TgUser = update.message.from_user
     feedback_msg = update.message.text
-    feedback_msg = f"{original_msg}||{feedback_msg}"
-    if len(feedback_msg) > 2048:
+    if len(feedback_msg) > MAX_FEEDBACK_LENGTH:
         output_message = ("看起來您發送的回饋太多或者回饋內容過長了。\n"
                           "Seems like you have sent too much feedback or the feedback is too long.")
         await update.message.reply_text(output_message, parse_mode=ParseMode.HTML)
-        await subscriber_service.set_attribute(user_id, mode=MODE_SUBSCRIBED)
+        await subscriber_service.set_attribute(subscriber.id, mode=MODE_SUBSCRIBED)
     else:
-        await subscriber_service.set_attribute(user_id, feedback=feedback_msg, mode=MODE_SUBSCRIBED)
+        await feedback_service.add(subscriber.id, subscriber.username, feedback_msg)
+        await subscriber_service.tick_usage(subscriber.id, "n_feedback")
+        await subscriber_service.set_attribute(subscriber.id, mode=MODE_SUBSCRIBED)
         await update.message.reply_text(
             "感恩回饋\nThank you for your feedback", parse_mode=ParseMode.HTML
         )
@@ -319,15 +368,15 @@ async def feedback(update: Update):
 
 async def rename_handler(update: Update, context: CallbackContext) -> None:
     subscriber: TgUser = update.message.from_user
-    is_exists: bool = await subscriber_service.exists(subscriber.id, False)
-    if not is_exists:
+    document: dict | None = await subscriber_service.get_attributes(subscriber.id, "mode", "username")
+    if document is None:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /start to continue.",
             parse_mode=ParseMode.HTML
         )
         return None
 
-    mode: str = await subscriber_service.get_attribute(subscriber.id, "mode")
+    mode: str | None = document.get("mode")
     if mode != MODE_SUBSCRIBED:
         await update.message.reply_text(
             "You are not subscribed to this Bot. Please click /subscribe to continue.",
@@ -354,7 +403,7 @@ async def rename_handler(update: Update, context: CallbackContext) -> None:
         ):
             output_message = cfg.sorry_single_language_only
         else:
-            old_username = await subscriber_service.get_attribute(subscriber.id, "username")
+            old_username = document.get("username")
             await subscriber_service.set_attribute(subscriber.id, username=new_username)
             output_message = f"Rename successful\n更換成功\n{old_username} => {new_username}"
         await update.message.reply_text(output_message, parse_mode=ParseMode.HTML)
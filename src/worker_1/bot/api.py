@@ -1,9 +1,8 @@
-import asyncio
-
 import telegram
 from telegram import Message
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
+from telegram.error import RetryAfter, TelegramError
+from telegram.request import HTTPXRequest
 
 from typing import Union, Callable, Awaitable, Optional
 import config as cfg
@@ -11,21 +10,75 @@ import library.filesystem as fs
 import library.validation as val
 import time
 
+# BadRequest messages of a file_id that Telegram does not accept (anymore) from this bot
+STALE_FILE_ID_MESSAGES = ("wrong file identifier", "wrong remote file identifier", "file reference expired")
+
+
+def build_bot(token: str, connection_pool_size: int = 1) -> telegram.Bot:
+    """
+    Create a Bot whose HTTP client can serve `connection_pool_size` requests concurrently.
+
+    The default Bot only keeps one connection, concurrent sends would queue on it and hit the pool timeout.
+    """
+    return telegram.Bot(token=token, request=HTTPXRequest(connection_pool_size=connection_pool_size))
+
+
+def resolve_url(filename_or_url: str) -> str:
+    """
+    Turn a URL or a file name under /online into the URL Telegram should fetch.
+
+    Raises:
+    - FileNotFoundError: If a file name is given and the file is not found locally.
+    """
+    if val.isURL(filename_or_url):
+        url = filename_or_url
+        if "?" not in url:
+            url = url + f"?{cfg.magic_postfix}"
+        return url
+    # ? to have a doc directory? won't hurt to dump them in one big folder
+    if fs.isLocalFile(filename_or_url, "/online"):
+        return f"{cfg.base_server}/{filename_or_url}?{cfg.magic_postfix}"
+    raise FileNotFoundError(filename_or_url)
+
+
+def is_stale_file_id(error: str) -> bool:
+    """
+    Tell whether a send error, "<telegram_id>=<ErrorClass>:<message>[, URL=<url>]", is Telegram rejecting the
+    file_id that was sent.
+    """
+    head, _, message = error.partition(":")
+    if head.split("=", 1)[-1] != "BadRequest":
+        return False
+    # The URL, or file_id, the send was given is appended to some errors and must not be matched
+    message = message.split(", URL=")[0].lower()
+    return any(text in message for text in STALE_FILE_ID_MESSAGES)
+
+
+def extract_file_id(message: Message) -> str | None:
+    """
+    Get the file_id of the media attached to a sent message, the largest size is chosen for photos.
+    """
+    attachment = message.effective_attachment
+    if isinstance(attachment, (list, tuple)):
+        attachment = attachment[-1] if len(attachment) > 0 else None
+    return getattr(attachment, "file_id", None)
+
 
 async def sendMessage(
-    bot: telegram.Bot, target_id: int, message: str, seconds: float = 0.0
+    bot: telegram.Bot, target_id: int, message: str
 ) -> Message | str:
     try:
-        if seconds > 0.0:
-            await asyncio.sleep(seconds)
         res = await bot.sendMessage(
             chat_id=target_id, text=message, parse_mode=ParseMode.HTML
         )
         return res
+    except RetryAfter:
+        # Flood control, left to the dispatcher to wait and retry
+        raise
     except TelegramError as tg_err:
-        return f"{target_id}=TelegramError:{str(tg_err)}"
+        return f"{target_id}={type(tg_err).__name__}:{str(tg_err)}"
     except Exception as e:
-        return f"{target_id}=Exception:{str(e)}"
+        return f"{target_id}={type(e).__name__}:{str(e)}"
 
 
 async def sendPhoto(
@@ -33,22 +86,24 @@ async def sendPhoto(
     target_id: int,
     filename_or_url: str,
     caption: str = "",
-    seconds: float = 0.0,
+    file_id: str | None = None,
 ) -> Message | str:
     """
     Asynchronously sends a photo to a specified target using a Telegram bot.
 
     This function supports sending a photo either by URL or from a local directory. If a URL is
     provided, it sends the photo directly. If a file name is provided, it checks if the file exists
-    in a predefined local directory and constructs a URL to send the photo. It can also introduce
-    a delay before sending the photo, specified by the `seconds` parameter.
+    in a predefined local directory and constructs a URL to send the photo. If a `file_id` of a previous
+    upload is provided, it is sent instead and Telegram does not fetch the file again.
+    Pacing is left to the caller (see `library.dispatcher.Dispatcher`), RetryAfter is re-raised for the
+    caller to wait and retry.
 
     Parameters:
     - bot (telegram.Bot): An instance of the Telegram Bot used to send the photo.
     - target_id (str): The Telegram chat_id where the photo will be sent.
     - photo (Any): The photo to be sent. Can be a URL or a local file name.
     - caption (str, optional): The caption for the photo. Defaults to an empty string.
-    - seconds (float, optional): A delay in seconds before sending the photo. Defaults to 0.0, meaning no delay.
+    - file_id (str, optional): Telegram file_id of the same photo. Defaults to None, meaning send by URL.
 
     Returns:
     - bool: True if the photo was sent successfully, False otherwise.
@@ -56,22 +111,12 @@ async def sendPhoto(
     Raises:
     - Exception: If the photo could not be found locally or any other issue occurs during the sending process.
                  Exceptions are caught and logged, but not re-raised.
+    - RetryAfter: If Telegram's flood control asks to wait.
 
     """
     url = None
     try:
-        if val.isURL(filename_or_url):
-            url = filename_or_url
-            if "?" not in url:
-                url = url + f"?{cfg.magic_postfix}"
-        else:
-            if fs.isLocalFile(filename_or_url, "/online"):
-                url = f"{cfg.base_server}/{filename_or_url}?{cfg.magic_postfix}"
-            else:
-                raise FileNotFoundError(filename_or_url)
-        
-        if seconds > 0.0:
-            await asyncio.sleep(seconds)
+        url = file_id or resolve_url(filename_or_url)
         t1 = time.time()
         res = await bot.sendPhoto(
             chat_id=target_id,
@@ -90,10 +135,13 @@ async def sendPhoto(
         return res
     except FileNotFoundError as file_not_found_err:
         return f"{target_id}=FileNotFoundError:{str(file_not_found_err)}, URL={url}"
+    except RetryAfter:
+        # Flood control, left to the dispatcher to wait and retry
+        raise
     except TelegramError as tg_err:
-        return f"{target_id}=TelegramError:{str(tg_err)}, URL={url}"
+        return f"{target_id}={type(tg_err).__name__}:{str(tg_err)}, URL={url}"
     except Exception as e:
-        return f"{target_id}=Exception:{str(e)}, URL={url}"
+        return f"{target_id}={type(e).__name__}:{str(e)}, URL={url}"
 
 
 async def sendVideo(
@@ -101,23 +149,11 @@ async def sendVideo(
     target_id: int,
     filename_or_url: str,
     caption: str = "",
-    seconds: float = 0.0,
+    file_id: str | None = None,
 ) -> Message | str:
     try:
-        if val.isURL(filename_or_url):
-            url = filename_or_url
-            if "?" not in url:
-                url = url + f"?{cfg.magic_postfix}"
-        else:
-            # ? to have a doc directory? won't hurt to dump them in one big folder
-            if fs.isLocalFile(filename_or_url, "/online"):
-                url = f"{cfg.base_server}/{filename_or_url}?{cfg.magic_postfix}"
-            else:
-                raise FileNotFoundError(filename_or_url)
-            
-        if seconds > 0.0:
-            await asyncio.sleep(seconds)
-        
+        url = file_id or resolve_url(filename_or_url)
+
         res = await bot.sendVideo(
             chat_id=target_id,
             video=url,
@@ -132,10 +168,13 @@ async def sendVideo(
         return res
     except FileNotFoundError as file_not_found_err:
         return f"{target_id}=FileNotFoundError:{str(file_not_found_err)}"
+    except RetryAfter:
+        # Flood control, left to the dispatcher to wait and retry
+        raise
     except TelegramError as tg_err:
-        return f"{target_id}=TelegramError:{str(tg_err)}"
+        return f"{target_id}={type(tg_err).__name__}:{str(tg_err)}"
     except Exception as e:
-        return f"{target_id}=Exception:{str(e)}"
+        return f"{target_id}={type(e).__name__}:{str(e)}"
 
 
 async def sendDocument(
@@ -143,22 +182,10 @@ async def sendDocument(
     target_id: int,
     filename_or_url: str,
     caption: str = "",
-    seconds: float = 0.0,
+    file_id: str | None = None,
 ) -> Message | str:
     try:
-        if val.isURL(filename_or_url):
-            url = filename_or_url
-            if "?" not in url:
-                url = url + f"?{cfg.magic_postfix}"
-        else:
-            # ? to have a doc directory? won't hurt to dump them in one big folder
-            if fs.isLocalFile(filename_or_url, "/online"):
-                url = f"{cfg.base_server}/{filename_or_url}?{cfg.magic_postfix}"
-            else:
-                raise FileNotFoundError(filename_or_url)
-        
-        if seconds > 0.0:
-            await asyncio.sleep(seconds)
+        url = file_id or resolve_url(filename_or_url)
 
         res = await bot.sendDocument(
             chat_id=target_id,
@@ -174,15 +201,18 @@ async def sendDocument(
         return res
     except FileNotFoundError as file_not_found_err:
         return f"{target_id}=FileNotFoundError:{str(file_not_found_err)}"
+    except RetryAfter:
+        # Flood control, left to the dispatcher to wait and retry
+        raise
     except TelegramError as tg_err:
-        return f"{target_id}=TelegramError:{str(tg_err)}"
+        return f"{target_id}={type(tg_err).__name__}:{str(tg_err)}"
     except Exception as e:
-        return f"{target_id}=Exception:{str(e)}"
+        return f"{target_id}={type(e).__name__}:{str(e)}"
 
 
 def selector(
         dtype: str
-) -> Optional[Callable[[telegram.Bot, int, str, str, float], Awaitable[Union[Message, str]]]]:
+) -> Optional[Callable[[telegram.Bot, int, str, str, str | None], Awaitable[Union[Message, str]]]]:
     if dtype == "Photo":
         return sendPhoto
     if dtype == "Document":
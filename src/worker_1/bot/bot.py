@@ -11,8 +11,6 @@ from telegram.ext import (
 
 import config
 
-import handlers
-
 # setup logging
 logging.basicConfig(
     filename=f"/error/worker_{config.bot_id}.log",
@@ -22,12 +20,17 @@ logging.basicConfig(
 
 
 def run_bot() -> None:
+    # Not imported at module level: the broadcast pool spawns processes that re-import this module, they must not
+    # build the services, the DB client and the dispatcher of the handlers
+    import handlers
+
     application = (
         ApplicationBuilder()
         .token(config.worker)
         .concurrent_updates(True)
         .rate_limiter(AIORateLimiter(max_retries=5))
         .post_init(handlers.post_init)
+        .post_shutdown(handlers.post_shutdown)
         .build()
     )
 
@@ -44,6 +47,7 @@ def run_bot() -> None:
     application.add_handler(CommandHandler("help", handlers.help_handler), group=1)
     application.add_handler(CommandHandler("count_subscribers", handlers.query_nos_button), group=1)
     application.add_handler(CommandHandler("export", handlers.export_subscribers_button), group=1)
+    application.add_handler(CommandHandler("export_feedback", handlers.export_feedback_button), group=1)
 
     application.add_handler(CommandHandler("weather", handlers.wapi), group=1)
     application.add_handler(CommandHandler("photo", handlers.get_photo), group=1)
@@ -68,6 +72,18 @@ def run_bot() -> None:
         CommandHandler("upload_subscriber_list", handlers.set_upload_subscriber_handler, filters=sysadmin_filter),
         group=1
     )
+    application.add_handler(
+        CommandHandler("migrate_file_tracking", handlers.migrate_file_tracking_handler, filters=sysadmin_filter),
+        group=1
+    )
+    application.add_handler(
+        CommandHandler("index_stats", handlers.index_stats_handler, filters=sysadmin_filter),
+        group=1
+    )
+    application.add_handler(
+        CommandHandler("db_stats", handlers.db_stats_handler, filters=sysadmin_filter),
+        group=1
+    )
     application.add_handler(MessageHandler(filters.TEXT, handlers.message_handler), group=1)
     application.add_handler(MessageHandler(filters.ATTACHMENT, handlers.attachment_handler), group=1)
     
@@ -0,0 +1,132 @@
+import asyncio
+import multiprocessing
+from multiprocessing.pool import Pool
+from typing import Any, Callable
+
+import telegram
+from telegram import Message
+from telegram.error import RetryAfter
+
+import api
+import config
+from library.dispatcher import Dispatcher
+
+# (telegram_id, username, error message or None when sent)
+CompactResult = tuple[int, str, str | None]
+
+# Per-process state, populated once by `_init_process` in every pool process.
+_loop: asyncio.AbstractEventLoop | None = None
+_bot: telegram.Bot | None = None
+_dispatcher: Dispatcher | None = None
+
+
+async def send_chunk(
+        bot: telegram.Bot, dispatcher: Dispatcher, dtype: str,
+        chunk: list[tuple[int, str]], url: str, caption: str, file_id: str | None = None
+) -> list[CompactResult]:
+    """
+    Send one media file to a chunk of (telegram_id, username) pairs through the dispatcher.
+
+    The cached `file_id` is sent when given, otherwise Telegram fetches the file from `url`.
+    A recipient still flood-waited after the dispatcher's retries counts as failed.
+
+    Returns:
+        list[CompactResult]: One compact result per recipient, in input order.
+    """
+    send_fn = api.selector(dtype)
+
+    async def send(recipient: tuple[int, str]) -> CompactResult:
+        user_id, username = recipient
+        try:
+            result = await dispatcher.run(user_id, lambda: send_fn(bot, user_id, url, caption, file_id))
+        except RetryAfter as retry_after:
+            result = f"{user_id}=RetryAfter:{str(retry_after)}"
+        return user_id, username, None if isinstance(result, Message) else result
+
+    return await asyncio.gather(*[send(recipient) for recipient in chunk])
+
+
+def _init_process(send_rate: float) -> None:
+    """
+    Pool initializer, keep one event loop, one pooled Bot and one dispatcher for the process lifetime.
+    """
+    global _loop, _bot, _dispatcher
+    _loop = asyncio.new_event_loop()
+    asyncio.set_event_loop(_loop)
+    _bot = api.build_bot(config.master, config.max_concurrency)
+    _dispatcher = Dispatcher(
+        config.max_concurrency, send_rate, config.per_chat_rate,
+        config.min_send_rate / config.use_nproc, config.max_retries
+    )
+
+
+def _send_chunk(
+        dtype: str, chunk: list[tuple[int, str]], url: str, caption: str, file_id: str | None
+) -> list[CompactResult]:
+    return _loop.run_until_complete(send_chunk(_bot, _dispatcher, dtype, chunk, url, caption, file_id))
+
+
+class BroadcastPool:
+    """
+    Process pool that lives across broadcast batches and jobs.
+
+    Processes are spawned on first use and kept until `close` is called. Recipients are dispatched in
+    chunks of `chunk_size` and every process receives an equal share of the global send rate.
+    """
+
+    def __init__(self, processes: int, chunk_size: int):
+        assert processes > 0, "processes must be positive"
+        assert chunk_size > 0, "chunk_size must be positive"
+        self.__processes = processes
+        self.__chunk_size = chunk_size
+        self.__pool: Pool | None = None
+
+    def __get_pool(self) -> Pool:
+        if self.__pool is None:
+            # spawn, so the processes do not inherit the parent's event loop and database client, they re-import
+            # the main module (bot.py, which imports handlers in `run_bot` only) and this module
+            self.__pool = multiprocessing.get_context("spawn").Pool(
+                processes=self.__processes,
+                initializer=_init_process,
+                initargs=(config.send_rate / self.__processes,),
+            )
+        return self.__pool
+
+    def __apply_async(self, fn: Callable[..., Any], args: tuple) -> asyncio.Future:
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+
+        def set_result(result: Any) -> None:
+            if not future.done():
+                future.set_result(result)
+
+        def set_exception(err: BaseException) -> None:
+            if not future.done():
+                future.set_exception(err)
+
+        # callbacks run in the pool's result handler thread
+        self.__get_pool().apply_async(
+            fn, args,
+            callback=lambda result: loop.call_soon_threadsafe(set_result, result),
+            error_callback=lambda err: loop.call_soon_threadsafe(set_exception, err),
+        )
+        return future
+
+    async def send(
+            self, dtype: str, recipients: list[tuple[int, str]], url: str, caption: str, file_id: str | None = None
+    ) -> list[CompactResult]:
+        futures = [
+            self.__apply_async(
+                _send_chunk, (dtype, recipients[i: i + self.__chunk_size], url, caption, file_id)
+            )
+            for i in range(0, len(recipients), self.__chunk_size)
+        ]
+        results: list[list[CompactResult]] = await asyncio.gather(*futures)
+        return [result for chunk_result in results for result in chunk_result]
+
+    def close(self) -> None:
+        if self.__pool is None:
+            return None
+        self.__pool.close()
+        self.__pool.join()
+        self.__pool = None
@@ -19,6 +19,7 @@ worker = config_yaml["TELEGRAM_TOKEN"]
 sysadmin_tid = config_yaml["SYSADMIN_ID"]
 allowed_tid = config_yaml["ALLOWED_TELEGRAM_ID"]
 allowed_username = config_yaml["ALLOWED_USERNAME"]
+allow_list_refresh_seconds = config_yaml.get("ALLOW_LIST_REFRESH_SECONDS", 30)
 
 x_api_key = config_yaml["X_API_KEY"]
 weather_api_key = config_yaml["WEATHER_API_KEY"]
@@ -26,12 +27,41 @@ base_server = config_yaml["MY_SERVER"]
 
 magic_postfix = config_yaml["MAGIC_POSTFIX"]
 
-seconds = config_yaml["SLEEP_SECONDS"]
+send_rate = config_yaml.get("SEND_RATE", 30)
+min_send_rate = config_yaml.get("MIN_SEND_RATE", 1)
+max_retries = config_yaml.get("MAX_RETRIES", 5)
+per_chat_rate = config_yaml.get("PER_CHAT_RATE", 1)
+max_concurrency = config_yaml.get("MAX_CONCURRENCY", 16)
 use_multiproc = config_yaml["USE_MULTI_PROCESS"] == 1
 use_nproc = config_yaml["USE_NPROC"]
+pool_chunk_size = config_yaml.get("POOL_CHUNK_SIZE", 25)
 db_find_limit = config_yaml["DB_FIND_LIMIT"]
+import_chunk_size = config_yaml.get("IMPORT_CHUNK_SIZE", 1000)
+export_batch_size = config_yaml.get("EXPORT_BATCH_SIZE", 500)
+export_gzip = config_yaml.get("EXPORT_GZIP", 0) == 1
+subscriber_count_mode = config_yaml.get("SUBSCRIBER_COUNT_MODE", "counter")
+counter_reconcile_seconds = config_yaml.get("COUNTER_RECONCILE_SECONDS", 3600)
+delivery_flush_size = config_yaml.get("DELIVERY_FLUSH_SIZE", 500)
+delivery_flush_seconds = config_yaml.get("DELIVERY_FLUSH_SECONDS", 2.0)
+progress_interval = config_yaml.get("PROGRESS_INTERVAL", 10)
+n_partition = config_yaml.get("PARTITIONS", 4)
+lease_seconds = config_yaml.get("LEASE_SECONDS", 60)
+partition_poll_seconds = config_yaml.get("PARTITION_POLL_SECONDS", 5)
+snapshot_chunk_size = config_yaml.get("SNAPSHOT_CHUNK_SIZE", 50000)
 
 media_types = config_yaml["MEDIA_TYPES"]
 
 mongodb_uri = f"mongodb://mongo:{config_env['MONGODB_PORT']}"
 mongodb_database = config_env["MONGODB_DATABASE"]
+mongodb_client_options = {
+    "maxPoolSize": config_yaml.get("MONGODB_MAX_POOL_SIZE", 100),
+    "minPoolSize": config_yaml.get("MONGODB_MIN_POOL_SIZE", 0),
+    "compressors": config_yaml.get("MONGODB_COMPRESSORS") or None,
+    "connectTimeoutMS": config_yaml.get("MONGODB_CONNECT_TIMEOUT_MS", 20000),
+    "serverSelectionTimeoutMS": config_yaml.get("MONGODB_SERVER_SELECTION_TIMEOUT_MS", 30000),
+    "socketTimeoutMS": config_yaml.get("MONGODB_SOCKET_TIMEOUT_MS"),
+    "waitQueueTimeoutMS": config_yaml.get("MONGODB_WAIT_QUEUE_TIMEOUT_MS"),
+    "readPreference": config_yaml.get("MONGODB_READ_PREFERENCE", "primary"),
+}
+db_metrics_log_seconds = config_yaml.get("DB_METRICS_LOG_SECONDS", 300)
+storage_backend = config_yaml.get("STORAGE_BACKEND", "mongo")
@@ -3,12 +3,14 @@ MODE_SUBSCRIBED = "subscribed"
 MODE_UNSUBSCRIBED = "unsubscribed"
 MODE_DEFAULT = "default"
 MODE_BROADCAST = "broadcast"
+MODE_BROADCASTING = "broadcasting"  # a submitted broadcast job is running
 MODE_FEEDBACK = "feedback"
 MODE_ADD_FILE = "add_file"
 MODE_ADD_PHOTO = "add_photo"
 MODE_ADD_DOCUMENT = "add_document"
 MODE_ADD_VIDEO = "add_video"
 MODE_LOAD_SUB = "load_sub"
+MODE_LOADING_SUB = "loading_sub"  # a subscriber list is being imported
 
 STATUS_ACTIVE = "active"
 STATUS_INACTIVE = "inactive"
@@ -1,7 +1,5 @@
+import hashlib as hx
 from dataclasses import dataclass
-from telegram import Message
-from multiprocessing.pool import ApplyResult
-from typing import Union
 from datetime import datetime
 
 
@@ -23,18 +21,23 @@ class BroadcastStats:
 
 
 @dataclass
-class JobSentInformation:
-    id: int
-    name: str
-    result: Union[ApplyResult[Message | str], Message | str]
-
-    def to_tuple(self) -> tuple[int, str, Union[ApplyResult[Message | str], Message | str]]:
-        return self.id, self.name, self.result
-
-    def dump(self) -> str:
+class MediaContent:
+    """
+    Media file being broadcast.
+
+    `file_id` is set once Telegram has accepted the upload, `primed` is set once a send succeeded with the
+    current `file_id` or URL during this broadcast.
+    """
+    dtype: str
+    url: str
+    caption: str
+    content_key: str
+    file_id: str | None = None
+    primed: bool = False
+
+    @property
+    def job_hash(self) -> str:
         """
-        Dump the JobSentInformation to a JSON formatted string.
+        Key marking the subscribers this file was sent to.
         """
-        template: str = '"id": "{id}", "name": "{name}", "result": "{result}"'
-        content_string = template.format(id=self.id, name=self.name, result=self.result)
-        return "{" + content_string + "}"
+        return hx.md5(self.url.encode()).hexdigest()
@@ -7,9 +7,8 @@ import os
 import re
 import time
 import traceback
+import uuid
 from datetime import datetime, timezone, timedelta
-from multiprocessing.pool import Pool
-from typing import Callable, Coroutine
 
 import requests
 import telegram
@@ -20,26 +19,55 @@ from telegram import (
     User as TgUser,
 )
 from telegram.constants import ParseMode
-from telegram.error import TelegramError
+from telegram.error import RetryAfter, TelegramError
 from telegram.ext import (
     CallbackContext,
 )
 
 import api
 import config
+from broadcast_pool import BroadcastPool, send_chunk
 import library.filesystem as fs
 import library.validation as val
+from library.dispatcher import Dispatcher
+from library.bulk_writer import BufferedBulkWriter
+from library.progress import ProgressReporter
+from library.outcome import OutcomeAggregator
 from const import *
 from my_functions import *
 from service import ServiceFactory
-from data_class.dtype import BroadcastStats
-
-sf = ServiceFactory(config.mongodb_uri, config.bot_id, config.mongodb_database)
+from data_class.dtype import BroadcastStats, MediaContent
+from service.feedback_service import FEEDBACK_COLUMNS
+from service.job_service import BroadcastJob, JOB_STATE_PENDING, JOB_STATE_RUNNING, JOB_STATE_DONE, JOB_STATE_FAILED
+from service.partition_service import JobPartition
+from service.snapshot_service import split_points
+from library.export_writer import EXPORT_CSV, EXPORT_NDJSON, ExportWriter
+from subscriber_import import STANDARD_COLUMNS, iter_import_chunks, write_import_rows
+
+sf = ServiceFactory(
+    config.mongodb_uri, config.bot_id, config.mongodb_database, config.allow_list_refresh_seconds,
+    config.subscriber_count_mode, config.mongodb_client_options, config.storage_backend, config.snapshot_chunk_size
+)
 admin_service: service.admin_service.AdminService = sf.get_service("admin")
 subscriber_service: service.subscriber_service.SubscriberService = sf.get_service(
     "subscriber"
 )
 super_service: service.super_service.SuperService = sf.get_service("super")
+media_cache_service: service.media_cache_service.MediaCacheService = sf.get_service("media_cache")
+delivery_service: service.delivery_service.DeliveryService = sf.get_service("delivery")
+job_service: service.job_service.JobService = sf.get_service("job")
+partition_service: service.partition_service.PartitionService = sf.get_service("job_partition")
+feedback_service: service.feedback_service.FeedbackService = sf.get_service("feedback")
+snapshot_service: service.snapshot_service.SnapshotService = sf.get_service("job_snapshot")
+
+dispatcher = Dispatcher(
+    config.max_concurrency, config.send_rate, config.per_chat_rate, config.min_send_rate, config.max_retries
+)
+broadcast_pool = BroadcastPool(config.use_nproc, config.pool_chunk_size)
+# Background broadcasts, referenced here so the event loop does not drop them
+broadcast_tasks: set[asyncio.Task] = set()
+# Set when this worker submits a job, wakes up the partition worker
+partition_ready = asyncio.Event()
 
 logger = logging.getLogger(__name__)
 
@@ -71,6 +99,9 @@ async def is_banned(user_id: int) -> bool:
 
     Returns:
         flag: bool If the user is banned return True, else return False.
+
+    Notes:
+        The allow list is served from memory, see `SuperService`.
     """
     return await super_service.not_in_allow_list(user_id)
 
@@ -82,6 +113,7 @@ available_commands = [
     ("/help", "Help"),
     ("/count_subscribers", "Get No. Active Subscribers"),
     ("/export", "Export List of Subscribers"),
+    ("/export_feedback", "Export Feedback of Subscribers"),
     ("/photo", "Get photo list"),
     ("/video", "Get video list"),
     ("/document", "Get document list"),
@@ -127,9 +159,32 @@ async def post_init(application: telegram.ext.Application) -> None:
     Steps:
     1. Set the available commands
     2. Set up the superuser allowed list
+    3. Create the DB indexes
+    4. Start claiming job partitions and resume broadcast jobs interrupted by the last shutdown
+    5. Start reconciling the subscriber counters
+    6. Start logging the MongoDB driver metrics
     """
     await application.bot.set_my_commands(available_commands)
     await init_superuser()
+    await sf.ensure_indexes()
+    await resume_broadcast_jobs(application)
+    start_background_task(reconcile_subscriber_counters())
+    if config.db_metrics_log_seconds > 0:
+        start_background_task(log_driver_metrics())
+
+
+async def post_shutdown(application: telegram.ext.Application) -> None:
+    """
+    Asynchronous handler to release resources before the bot exits.
+
+    Args:
+        application: Application
+
+    Returns:
+        None
+    """
+    await cancel_broadcast_jobs()
+    broadcast_pool.close()
 
 
 async def middleware_function(update: Update, context: CallbackContext):
@@ -277,8 +332,8 @@ async def set_broadcast_mode_handler(update: Update, context: CallbackContext):
     - whether the user is banned
 
     Processes:
-    - Try to switch to broadcast mode if not already set to broadcast mode
-    - Set dtype to the selected data type
+    - Switch to broadcast mode if not already set to broadcast mode and set dtype to the selected data type,
+      atomically
 
     Response:
     - If success, prompt user to submit content to be broadcast
@@ -291,21 +346,19 @@ async def set_broadcast_mode_handler(update: Update, context: CallbackContext):
             "You are banned from using this bot", parse_mode=ParseMode.HTML
         )
         return None
-    mode: str = await admin_service.get_attribute(admin_user.id, "mode")
-    if mode != MODE_BROADCAST:
+    query = update.callback_query
+    await query.answer()
+    choice = query.data.split("|")[1]
+    if choice in config.media_types:
+        # Stay in or switch to broadcast mode and set the data type in one step
         ready: bool = await admin_service.try_switch_mode(
-            admin_user.id, MODE_BROADCAST, MODE_DEFAULT
+            admin_user.id, MODE_BROADCAST, [MODE_BROADCAST, MODE_DEFAULT], dtype=choice
         )
-        if ~ready:
+        if not ready:
             await context.bot.send_message(
                 admin_user.id, "Occupied, please try again later", parse_mode=ParseMode.HTML
             )
             return None
-    query = update.callback_query
-    await query.answer()
-    choice = query.data.split("|")[1]
-    if choice in config.media_types:
-        await admin_service.set_attribute(admin_user.id, dtype=choice)
         reply_text = f"Ready to broadcast <strong>{choice}</strong>."
         await context.bot.send_message(admin_user.id, reply_text, parse_mode=ParseMode.HTML)
 
@@ -349,186 +402,509 @@ async def message_handler(update: Update, context: CallbackContext, message=None
             "You are banned from using this bot", parse_mode=ParseMode.HTML
         )
         return None
-    mode: str = await admin_service.get_attribute(admin_user.id, "mode")
-    dtype: str = await admin_service.get_attribute(admin_user.id, "dtype")
+    # Take the broadcast lock, a concurrent message finds the mode already moved on
+    claimed: dict | None = await admin_service.compare_and_set(
+        admin_user.id, MODE_BROADCAST, mode=MODE_BROADCASTING
+    )
+    dtype: str | None = claimed.get("dtype") if claimed is not None else None
 
     output_msg: str = "Let us play dumb for now."  # default reply
+    submitted: bool = False
     try:
         _message = message or update.message.text
-        if mode == MODE_BROADCAST and dtype in config.media_types:
-            t1 = time.time()
-            stats: BroadcastStats = await broadcast(dtype, _message, config.seconds)
-            t2 = time.time()
-            output_msg = f"{stats}\nElapsed time: {t2 - t1} seconds."
-        else:
-            sender_info = extract_forwarded_sender_info(update)
-            if sender_info:
-                output_msg = sender_info
+        if claimed is not None and dtype in config.media_types:
+            job = await create_broadcast_job(dtype, _message, admin_user.id)
+            # The reply doubles as the progress message of the job
+            progress_message = await update.message.reply_text(
+                "Broadcast submitted.", parse_mode=ParseMode.HTML
+            )
+            submit_broadcast_job(context.bot, job, progress_message)
+            submitted = True
+            return None
+        sender_info = extract_forwarded_sender_info(update)
+        if sender_info:
+            output_msg = sender_info
         await update.message.reply_text(output_msg, parse_mode=ParseMode.HTML, )
     except Exception as e:
         logger.error(f"[/message_handler] => user: {admin_user.id}, output_message: {output_msg}, error: {e}")
         await update.message.reply_text(str(e), parse_mode=ParseMode.HTML,)
     finally:
-        if mode == MODE_BROADCAST:
+        # A submitted job releases the lock once it ends
+        if claimed is not None and not submitted:
             await release_handler(update, context, False)
 
 
-async def broadcast(dtype: str, content: str, seconds: float = 0.2) -> BroadcastStats:
+async def create_broadcast_job(dtype: str, content: str, admin_id: int) -> BroadcastJob:
     """
-    Broadcast to all active subscribers
+    Persist a broadcast to all active subscribers as a job split into partitions
+
+    Returns:
+    - The job
+
+    Notes:
+    - Three way to broadcast: Text, Media
+    - Media jobs are identified by the file, a file is only sent once to each subscriber
+    - Text jobs are identified by a random hashcode, a text is only sent once to each subscriber per job
+    - The audience, active subscribers who did not receive the job yet, is frozen into a snapshot of the job,
+      sending the job reads the snapshot only
+    - The job is pending while its snapshot is written, a job that could not be set up is marked as failed
+    - The audience is split into `config.n_partition` telegram_id ranges, any worker can claim a range unless
+      the job is pinned to this worker, see `partition_pin`
+    """
+    if dtype == "Text":
+        job_hash = uuid.uuid4().hex
+    else:
+        media = await load_media_content(dtype, content)
+        job_hash = media.job_hash
+    job = BroadcastJob(str(config.bot_id), admin_id, dtype, content, job_hash, state=JOB_STATE_PENDING)
+    await job_service.create(job)
+    try:
+        # Texts are personalized with the username, media only need the telegram_id
+        fields: list[str] = ["username"] if dtype == "Text" else []
+        telegram_ids = await snapshot_service.create(
+            job.job_id,
+            subscriber_service.iter_pages(
+                STATUS_ACTIVE, config.snapshot_chunk_size, fields, undelivered_of=job_hash
+            ),
+            dtype == "Text"
+        )
+        bounds: list[int] = split_points(telegram_ids, config.n_partition)
+        job.n_partition, job.n_audience = len(bounds) + 1, len(telegram_ids)
+        # Running from here on, a restart before the partitions exist resumes the job with a single partition
+        await job_service.set_audience(job)
+        await partition_service.create(job.job_id, bounds, partition_pin(job))
+    except Exception:
+        # The admin is told the broadcast failed, it must not be resumed
+        await job_service.finish(job, JOB_STATE_FAILED)
+        await snapshot_service.delete(job.job_id)
+        raise
+    return job
+
+
+def partition_pin(job: BroadcastJob) -> str | None:
+    """
+    Worker the partitions of a job must be sent by, None when any worker can send them.
+
+    Notes:
+    - A media file given by name is read from the /online directory and served through the MY_SERVER of the
+      worker that created the job, other workers have neither.
+    """
+    if job.dtype == "Text" or val.isURL(job.content.split("@@@")[0]):
+        return None
+    return job.bot_id
+
+
+def start_background_task(coroutine) -> asyncio.Task:
+    """
+    Run a broadcast or maintenance coroutine in the background, the caller returns immediately.
+
+    Notes:
+    - The tasks are not registered with the application, so stopping the bot does not wait for the broadcast,
+      `post_shutdown` cancels them and the jobs are resumed on the next start.
+    """
+    task = asyncio.create_task(coroutine)
+    broadcast_tasks.add(task)
+    task.add_done_callback(broadcast_tasks.discard)
+    return task
+
+
+def submit_broadcast_job(bot: telegram.Bot, job: BroadcastJob, progress_message: Message | None) -> None:
+    """
+    Hand the partitions of a job to the partition workers and supervise the job in the background.
+    """
+    partition_ready.set()
+    start_background_task(supervise_broadcast_job(bot, job, progress_message))
+
+
+async def cancel_broadcast_jobs() -> None:
+    """
+    Cancel the background broadcasts, their jobs and partitions stay running in the DB.
+    """
+    tasks = list(broadcast_tasks)
+    for task in tasks:
+        task.cancel()
+    await asyncio.gather(*tasks, return_exceptions=True)
+
+
+async def supervise_broadcast_job(bot: telegram.Bot, job: BroadcastJob, progress_message: Message | None) -> None:
+    """
+    Follow a job until all its partitions ended, then release the admin's broadcast lock.
 
     Processes:
-    - Iteratively get small batch of active subscribers
-    - Broadcast to each subscriber
+    - Size the progress by the audience snapshot, or for a job without one, by the active subscribers the job
+      was not delivered to yet
+    - Every `config.progress_interval` seconds, sum the counters of the partitions into the job and edit the
+      progress message with the sent/failed counts, the current rate and the ETA
+    - Replace the progress message with the final stats once the job ends, drop its snapshot and, for a text,
+      its delivery markers
 
-    Response:
-    - Broadcast stats
+    Notes:
+    - The partitions are sent by whichever workers claimed them, including this one.
+    - Without a progress message the final stats are sent to the admin as a new message.
+    - A cancellation (shutdown) keeps the lock, the resumed job releases it.
+    """
+    async def render(text: str) -> None:
+        if progress_message is None:
+            return None
+        await progress_message.edit_text(text, parse_mode=ParseMode.HTML)
+
+    if job.n_audience is not None:
+        n_total: int = job.n_audience
+    else:
+        # Subscribers who already received the job are not sent again, e.g. a file re-broadcast
+        n_total: int = await subscriber_service.get_pending_count(STATUS_ACTIVE, job.job_hash) + job.n_success
+    reporter = ProgressReporter(render, f"Broadcasting {job.dtype}...", n_total, config.progress_interval)
+    reporter.start(job.n_success, job.n_failed)
+    t1 = time.time()
+    try:
+        while True:
+            summary: dict = await partition_service.summarize(job.job_id)
+            job.n_job, job.n_success, job.n_failed = summary["n_job"], summary["n_success"], summary["n_failed"]
+            reporter.update(job.n_success, job.n_failed)
+            if summary[JOB_STATE_RUNNING] == 0:
+                break
+            await job_service.checkpoint(job)
+            await asyncio.sleep(config.progress_interval)
+        n_failed_partition: int = summary[JOB_STATE_FAILED]
+        await job_service.finish(job, JOB_STATE_FAILED if n_failed_partition > 0 else JOB_STATE_DONE)
+        await snapshot_service.delete(job.job_id)
+        if job.dtype == "Text":
+            # A text job hash is never sent again, its delivery markers only keep resumed partitions from sending
+            # twice while it runs
+            await delivery_service.reset(job.job_hash)
+        t2 = time.time()
+        stats = BroadcastStats(job.n_job, job.n_success, job.n_failed)
+        output_msg = f"{stats}\nElapsed time: {t2 - t1} seconds."
+        if n_failed_partition > 0:
+            output_msg = f"Broadcast failed on {n_failed_partition}/{job.n_partition} partitions.\n{output_msg}"
+    except asyncio.CancelledError:
+        raise
+    except Exception as e:
+        logger.error(f"[supervise_broadcast_job] => job: {job.job_id}, error: {e}")
+        output_msg = f"Broadcast failed.\n{e}"
+    finally:
+        await reporter.stop()
+    # Leave other modes alone, the admin may have released the lock and moved on
+    await admin_service.compare_and_set(job.admin_id, MODE_BROADCASTING, mode=MODE_DEFAULT, dtype="")
+    try:
+        if progress_message is None:
+            await bot.send_message(job.admin_id, output_msg, parse_mode=ParseMode.HTML)
+        else:
+            await progress_message.edit_text(output_msg, parse_mode=ParseMode.HTML)
+    except TelegramError as tg_err:
+        logger.error(f"[supervise_broadcast_job]=TelegramError:{str(tg_err)}")
+
+
+async def reconcile_subscriber_counters() -> None:
+    """
+    Recompute the per-status subscriber counters now and every `config.counter_reconcile_seconds` seconds.
 
     Notes:
-    - Three way to broadcast: Text, Media
+    - The counters are moved on every status change, this only corrects drift, e.g. from status changes
+      written to the DB by hand.
     """
-    master = telegram.Bot(token=config.master)
-    n: int = await subscriber_service.get_count(STATUS_ACTIVE)
-    acc_stats = BroadcastStats(0, 0, 0)  # Accumulated Stats
-    for i in range(0, n, config.db_find_limit):
-        # Get a small batch of subscribers
-        subscribers = await subscriber_service.get_all(
-            STATUS_ACTIVE, skip=i, limit=config.db_find_limit
+    while True:
+        try:
+            counts: dict[str, int] = await subscriber_service.reconcile_counters()
+            logger.info(f"[RECONCILE] => {counts}")
+        except Exception as e:
+            logger.error(f"[reconcile_subscriber_counters] => {str(e)}")
+        await asyncio.sleep(config.counter_reconcile_seconds)
+
+
+async def log_driver_metrics() -> None:
+    """
+    Log the connection pool and command counters of the MongoDB client as one JSON line every
+    `config.db_metrics_log_seconds` seconds, for the monitoring to scrape.
+    """
+    while True:
+        await asyncio.sleep(config.db_metrics_log_seconds)
+        logger.info(f"[DB_METRICS] => {json.dumps(sf.driver_metrics())}")
+
+
+async def run_partition_worker() -> None:
+    """
+    Claim and send partitions of running jobs, one at a time, for as long as the bot runs.
+
+    Notes:
+    - Partitions are claimed under this worker's MY_ID, so a restarted worker takes its own partitions back
+      immediately, the partitions of a dead worker are taken over once their lease expired.
+    - Partitions of a local file are pinned to the worker that created the job and wait for it.
+    - Every worker paces itself with its own SEND_RATE, yet they all send through the same master bot, which
+      Telegram limits as a whole. The send rates of the workers sharing a DB add up and must stay within it.
+    - The loop wakes up when this worker submits a job, otherwise it polls every
+      `config.partition_poll_seconds` seconds.
+    """
+    owner = str(config.bot_id)
+    while True:
+        partition_ready.clear()
+        partition: JobPartition | None = await partition_service.claim(owner, config.lease_seconds)
+        if partition is None:
+            try:
+                await asyncio.wait_for(partition_ready.wait(), config.partition_poll_seconds)
+            except asyncio.TimeoutError:
+                pass
+            continue
+        logger.info(f"[CLAIM] => job: {partition.job_id}, partition: {partition.index}, cursor: {partition.cursor}")
+        try:
+            await run_partition(partition)
+        except Exception as e:
+            logger.error(f"[run_partition_worker] => job: {partition.job_id}, partition: {partition.index}, error: {e}")
+
+
+async def keep_lease(partition: JobPartition) -> None:
+    """
+    Renew the lease of a partition until cancelled, return once the lease was lost.
+    """
+    while True:
+        await asyncio.sleep(config.lease_seconds / 3)
+        if not await partition_service.renew(partition, config.lease_seconds):
+            return None
+
+
+async def run_partition(partition: JobPartition) -> BroadcastStats:
+    """
+    Send a claimed partition to completion.
+
+    Processes:
+    - Iteratively get small batch of subscribers of the partition's range after its cursor from the audience
+      snapshot of the job, a job without one pages the active subscribers, either way subscribers who already
+      received the job are skipped
+    - Broadcast to each subscriber
+    - Count the outcomes as they arrive and append the failures to the partition's log file
+    - Checkpoint after every batch: write the delivery markers, then move the cursor and counters and
+      extend the lease
+
+    Notes:
+    - An exception marks the partition as failed, a cancellation (shutdown) leaves it running to be resumed.
+    - The partition is dropped without further writes once its lease was taken over by another worker.
+    """
+    job: BroadcastJob | None = await job_service.get(partition.job_id)
+    if job is None or job.state != JOB_STATE_RUNNING:
+        await partition_service.finish(partition, JOB_STATE_FAILED)
+        return BroadcastStats(partition.n_job, partition.n_success, partition.n_failed)
+    master = api.build_bot(config.master, config.max_concurrency)
+    media: MediaContent | None = None
+    if job.dtype != "Text":
+        media = await load_media_content(job.dtype, job.content)
+    acc_stats = BroadcastStats(partition.n_job, partition.n_success, partition.n_failed)  # Accumulated Stats
+    # Delivery markers are written in batches, the last batch is flushed when the partition ends
+    marker_writer = BufferedBulkWriter(
+        delivery_service.bulk_write, config.delivery_flush_size, config.delivery_flush_seconds
+    )
+    # Failures of the partition are logged to one file, the successes are only counted
+    suffix = str(datetime.now().timestamp()).split(".")[0]
+    log_name = "sendMessage" if job.dtype == "Text" else job.dtype
+    outcomes = OutcomeAggregator(
+        f"/error/log_{config.bot_id}_{log_name}_{suffix}.csv",
+        f"Content:{job.content if media is None else media.url}"
+    )
+    if job.n_audience is not None:
+        pages = skip_delivered(delivery_service, snapshot_service.iter_pages(
+            job.job_id, config.db_find_limit, after_id=partition.after_id, until_id=partition.upper_id
+        ), job.job_hash)
+    else:
+        pages = subscriber_service.iter_pages(
+            STATUS_ACTIVE, config.db_find_limit, ["username"],
+            after_id=partition.after_id, undelivered_of=job.job_hash, until_id=partition.upper_id
         )
-        # Switch to one of the three ways to broadcast
-        if dtype == "Text":
-            stats: BroadcastStats = await broadcast_message(
-                master, subscribers, content, seconds
+    lease = asyncio.ensure_future(keep_lease(partition))
+    try:
+        # Get a small batch of subscribers
+        async for subscribers in pages:
+            if lease.done():
+                logger.warning(f"[run_partition] => lost lease of job: {job.job_id}, partition: {partition.index}")
+                return acc_stats
+            # Switch to one of the three ways to broadcast
+            if job.dtype == "Text":
+                stats: BroadcastStats = await broadcast_message(
+                    master, subscribers, job.content, marker_writer, outcomes, job.job_hash
+                )
+            else:
+                stats: BroadcastStats = await broadcast_media(
+                    master, subscribers, media, marker_writer, outcomes, config.use_multiproc, config.use_nproc,
+                )
+            acc_stats = acc_stats + stats
+            # Checkpoint
+            await marker_writer.flush()
+            outcomes.flush()
+            partition.cursor = subscribers[-1]["telegram_id"]
+            partition.n_job, partition.n_success, partition.n_failed = (
+                acc_stats.n_job, acc_stats.n_success, acc_stats.n_failed
             )
-        else:
-            stats: BroadcastStats = await broadcast_media(
-                subscribers, dtype, content, config.use_multiproc, config.use_nproc, seconds,
+            if not await partition_service.checkpoint(partition, config.lease_seconds):
+                logger.warning(f"[run_partition] => lost lease of job: {job.job_id}, partition: {partition.index}")
+                return acc_stats
+    except Exception:
+        await partition_service.finish(partition, JOB_STATE_FAILED)
+        raise
+    finally:
+        lease.cancel()
+        await marker_writer.close()
+        outcomes.close()
+        if outcomes.n_failed > 0:
+            logger.info(
+                f"[run_partition] => job: {job.job_id}, partition: {partition.index}, failed: {outcomes.error_counts}"
             )
-        acc_stats = acc_stats + stats
+    await partition_service.finish(partition, JOB_STATE_DONE)
     return acc_stats
 
 
-def task_wrapper(
-        method: Callable[[telegram.Bot, int, str, str, float], Coroutine[Any, Any, Message | str]],
-        subscriber: dict, url: str, caption: str, seconds: float = 0.0
-) -> Message | str:
+async def resume_broadcast_jobs(application: telegram.ext.Application) -> None:
     """
-    Wrapper function to make async function non-async to that it can be dispatched to new process.
+    Start the partition worker and resume supervising the jobs of this bot that were still running when it
+    stopped.
+
+    Notes:
+    - Jobs still pending were interrupted while their snapshot was written, they are marked as failed, their
+      snapshot is dropped, their admin's broadcast lock is released and the admin is told.
+    - The admin receives a new progress message for every resumed job.
+    - A job persisted before jobs were partitioned receives one partition covering the whole audience, the
+      subscribers it already reached are skipped through the delivery markers.
     """
-    return asyncio.run(
-        method(
-            telegram.Bot(token=config.master),
-            subscriber["telegram_id"],
-            url,
-            caption,
-            seconds,
-        )
-    )
+    for job in await job_service.list_by_state(str(config.bot_id), JOB_STATE_PENDING):
+        logger.info(f"[ABANDON] => job: {job.job_id}")
+        await job_service.finish(job, JOB_STATE_FAILED)
+        await snapshot_service.delete(job.job_id)
+        await admin_service.compare_and_set(job.admin_id, MODE_BROADCASTING, mode=MODE_DEFAULT, dtype="")
+        try:
+            await application.bot.send_message(
+                job.admin_id, "A broadcast was interrupted while being prepared and was not sent.",
+                parse_mode=ParseMode.HTML
+            )
+        except TelegramError as tg_err:
+            logger.error(f"[resume_broadcast_jobs]=TelegramError:{str(tg_err)}")
+    start_background_task(run_partition_worker())
+    for job in await job_service.list_running(str(config.bot_id)):
+        logger.info(f"[RESUME] => job: {job.job_id}")
+        summary: dict = await partition_service.summarize(job.job_id)
+        if summary[JOB_STATE_RUNNING] + summary[JOB_STATE_DONE] + summary[JOB_STATE_FAILED] == 0:
+            await partition_service.create(job.job_id, [], partition_pin(job))
+        progress_message: Message | None = None
+        try:
+            progress_message = await application.bot.send_message(
+                job.admin_id, "Resuming interrupted broadcast.", parse_mode=ParseMode.HTML
+            )
+        except TelegramError as tg_err:
+            logger.error(f"[resume_broadcast_jobs]=TelegramError:{str(tg_err)}")
+        submit_broadcast_job(application.bot, job, progress_message)
 
 
-async def broadcast_media(
-        subscribers, dtype: str, params: str, use_multiproc=True, use_nproc=2, seconds=0.2
-) -> BroadcastStats:
-    send_fn = api.selector(dtype)
+async def load_media_content(dtype: str, params: str) -> MediaContent:
+    """
+    Parse the broadcast content ("filename_or_url@@@caption") and look up the cached file_id.
+    """
     url = params[:]
     caption = ""
     if "@@@" in url:
         caption = url.split("@@@")[-1]
         url = url.split("@@@")[0]
+    content_key = await asyncio.to_thread(compute_content_key, config.master, dtype, url)
+    file_id = await media_cache_service.get_file_id(content_key)
+    return MediaContent(dtype, url, caption, content_key, file_id)
+
+
+async def prime_media(
+        master, media: MediaContent, recipients: list[tuple[int, str]], max_attempt: int = 3
+) -> list[tuple[int, str, str | None]]:
+    """
+    Send the media to recipients one at a time until Telegram accepts it.
+
+    Processes:
+    - Send with the cached file_id if there is one, drop it from the cache if Telegram rejects it
+    - Otherwise send by URL and cache the file_id of the first successful upload
 
-    job_hash = hx.md5(url.encode()).hexdigest()
-    res_list: Queue[JobSentInformation] = (
-        Queue()
-    )  # import multiprocessing.pool.ApplyResult failed
+    Notes:
+    - Recipients served here are removed from `recipients`
+    - Give up priming after `max_attempt` failed URL sends, the rest is sent by URL
+    """
+    send_fn = api.selector(media.dtype)
+    results: list[tuple[int, str, str | None]] = list()
+    n_attempt = 0
+    while len(recipients) > 0 and not media.primed and n_attempt < max_attempt:
+        user_id, username = recipients.pop(0)
+        try:
+            result = await dispatcher.run(
+                user_id, lambda: send_fn(master, user_id, media.url, media.caption, media.file_id)
+            )
+        except RetryAfter as retry_after:
+            result = f"{user_id}=RetryAfter:{str(retry_after)}"
+        if type(result) is Message:
+            media.primed = True
+            if media.file_id is None:
+                media.file_id = api.extract_file_id(result)
+                if media.file_id:
+                    await media_cache_service.set_file_id(media.content_key, media.dtype, media.file_id)
+            results.append((user_id, username, None))
+        elif media.file_id is not None and api.is_stale_file_id(result):
+            # Stale or foreign file_id, retry this recipient by URL
+            logger.warning(f"[prime_media] => drop cached file_id of {media.url}: {result}")
+            await media_cache_service.invalidate(media.content_key)
+            media.file_id = None
+            recipients.insert(0, (user_id, username))
+        else:
+            n_attempt += 1
+            results.append((user_id, username, result))
+    return results
+
+
+async def broadcast_media(
+        master, subscribers, media: MediaContent, marker_writer: BufferedBulkWriter, outcomes: OutcomeAggregator,
+        use_multiproc=True, use_nproc=2
+) -> BroadcastStats:
+    dtype, url, caption, job_hash = media.dtype, media.url, media.caption, media.job_hash
+    n_sent, n_failed = outcomes.n_sent, outcomes.n_failed
+    recipients: list[tuple[int, str]] = [
+        (subscriber["telegram_id"], str(subscriber["username"])) for subscriber in subscribers
+    ]
+    # Upload once, later recipients receive the file_id
+    results = await prime_media(master, media, recipients)
     if use_multiproc and use_nproc <= os.cpu_count():
-        with Pool(processes=use_nproc) as pool:
-            # Sequentially dispatch task to new process
-            for subscriber in subscribers:
-                if is_job_done(subscriber, job_hash):
-                    continue
-
-                user_id = subscriber["telegram_id"]
-                username = str(subscriber["username"])
-                _sub = {"telegram_id": user_id, "username": username}
-                res = pool.apply_async(
-                    task_wrapper,
-                    args=(send_fn, _sub, url, caption, seconds,),
-                    callback=lambda ret: None,
-                    error_callback=lambda err: None,
-                )
-                res_list.put(JobSentInformation(user_id, username, res))
-            #
-            pool.close()
-            pool.join()
-        # BEGIN log
-        sent_list, failed_list = group_by_result(res_list, True)
+        # Dispatch chunks of recipients to the persistent process pool
+        results += await broadcast_pool.send(dtype, recipients, url, caption, media.file_id)
     else:
         if use_multiproc:
             logger.warning(
                 f"broadcast_media: {use_nproc} > {os.cpu_count()}\nFallback to single process operation."
             )
-        res_list: list[JobSentInformation] = list()
-        master_bot = telegram.Bot(token=config.master)
-        # Sequentially send content to subscribers
-        for idx, subscriber in enumerate(subscribers):
-            if is_job_done(subscriber, job_hash):
-                continue
-
-            user_id = subscriber["telegram_id"]
-            username = str(subscriber["username"])
-            res_list.append(
-                JobSentInformation(
-                    user_id,
-                    username,
-                    await send_fn(master_bot, user_id, url, caption, seconds, ),
-                )
-            )
-
-        # BEGIN log
-        sent_list, failed_list = group_by_result_list(res_list, False)
-
-    n_job = len(sent_list) + len(failed_list)
-    n_success = len(sent_list)
-    # Sent Case
-    for _sub in sent_list:
-        subscriber_id, _, tel_msg = _sub.to_tuple()
-        await set_job_as_done(subscriber_service, subscriber_id, job_hash)
-    # Failed Case
-    suffix = str(datetime.now().timestamp()).split(".")[0]
-    log_sheet = f"/error/log_{config.bot_id}_{dtype}_{suffix}.csv"
-    write_sent_result(log_sheet, failed_list, url)
-    # END log
-    return BroadcastStats(n_job, n_success, n_job - n_success)  # total, successful, failed
+        # Concurrently send content to subscribers, paced by the dispatcher
+        results += await send_chunk(master, dispatcher, dtype, recipients, url, caption, media.file_id)
+    for subscriber_id, username, error in results:
+        await record_outcome(outcomes, marker_writer, job_hash, subscriber_id, username, error)
+    n_success, n_failed = outcomes.n_sent - n_sent, outcomes.n_failed - n_failed
+    return BroadcastStats(n_success + n_failed, n_success, n_failed)  # total, successful, failed
 
 
 async def broadcast_message(
-        master, subscribers, content: str, seconds: float = 0.2
+        master, subscribers, content: str, marker_writer: BufferedBulkWriter, outcomes: OutcomeAggregator,
+        job_hash: str
 ) -> BroadcastStats:
-    sent_queue: Queue[JobSentInformation] = Queue()
+    n_sent, n_failed = outcomes.n_sent, outcomes.n_failed
 
-    for subscriber in subscribers:
+    async def send(subscriber: dict) -> None:
+        telegram_id: int = subscriber["telegram_id"]
         try:
             output_text = content.replace("username", subscriber["username"])
-            sent_queue.put(
-                JobSentInformation(
-                    subscriber["telegram_id"],
-                    subscriber["username"],
-                    await api.sendMessage(
-                        master, subscriber["telegram_id"], output_text, seconds
-                    )
+            try:
+                result = await dispatcher.run(
+                    telegram_id, lambda: api.sendMessage(master, telegram_id, output_text)
                 )
-            )
+            except RetryAfter as retry_after:
+                result = f"{telegram_id}=RetryAfter:{str(retry_after)}"
         except Exception as e:
-            print(str(e))
-    sent_list, failed_list = group_by_result(sent_queue, False)
-    n_job = len(sent_list) + len(failed_list)
-    n_success = len(sent_list)
-    # Failed
-    suffix = str(datetime.now().timestamp()).split(".")[0]
-    log_sheet = f"/error/log_{config.bot_id}_sendMessage_{suffix}.csv"
-    write_sent_result(log_sheet, failed_list, content)
-    # END log
-    return BroadcastStats(n_job, n_success, n_job - n_success)  # total, successful, failed
+            # Counted as failed, every subscriber of the batch has an outcome
+            logger.error(f"[broadcast_message] => subscriber: {telegram_id}, error: {e}")
+            result = f"{telegram_id}={type(e).__name__}:{str(e)}"
+        # Failing to record (e.g. the marker write) fails the partition, it is resumed from its last checkpoint
+        await record_outcome(
+            outcomes, marker_writer, job_hash, telegram_id, subscriber["username"],
+            None if type(result) is Message else result
+        )
+
+    # Concurrently send content to subscribers, paced by the dispatcher
+    await asyncio.gather(*[send(subscriber) for subscriber in subscribers])
+    n_success, n_failed = outcomes.n_sent - n_sent, outcomes.n_failed - n_failed
+    return BroadcastStats(n_success + n_failed, n_success, n_failed)  # total, successful, failed
 
 
 async def query_nos_button(update: Update, context: CallbackContext):
@@ -552,9 +928,37 @@ async def query_nos_button(update: Update, context: CallbackContext):
     )
 
 
+async def export_subscribers(statuses: list[str], path: str, export_format: str) -> int:
+    """
+    Stream subscribers of `statuses` from the DB into an export file.
+
+    Returns:
+        int: number of subscribers exported
+
+    Notes:
+        - Memory is bounded by the batch size, whatever the number of subscribers.
+    """
+    writer = ExportWriter(path, export_format, STANDARD_COLUMNS)
+    try:
+        for status in statuses:
+            async for batch in subscriber_service.iter_batches(status, config.export_batch_size):
+                await writer.write(batch)
+    finally:
+        n_exported = await writer.close()
+    return n_exported
+
+
+def export_path(name: str, export_format: str) -> str:
+    suffix = str(datetime.now().timestamp()).split(".")[0]
+    path = f"/data/{name}_{suffix}.{export_format}"
+    if config.export_gzip:
+        path += ".gz"
+    return path
+
+
 async def export_subscribers_button(update: Update, context: CallbackContext):
     """
-    Export the list of subscribers in csv format.
+    Export the list of active subscribers in csv format.
     """
     is_not_allowed: bool = await is_banned(update.message.from_user.id)
     if is_not_allowed:
@@ -563,49 +967,24 @@ async def export_subscribers_button(update: Update, context: CallbackContext):
         )
         return None
 
-    suffix = str(datetime.now().timestamp()).split(".")[0]
-    log_sheet = f"/data/subscribers_{suffix}.csv"
-    with open(log_sheet, "w", encoding="utf-8") as file:
-        columns = [
-            "telegram_id", "chat_id", "username", "mode", "status",
-            "n_feedback", "feedback", "reg_datetime",
-        ]
-        keys = ",".join(columns)
-        file.write(f"{keys}\n")
-
-        n: int = await subscriber_service.get_count(STATUS_ACTIVE)
-        subscribers = await subscriber_service.get_all(STATUS_ACTIVE, 0, n)
-        for subscriber in subscribers:
-            user_columns = subscriber.keys()
-
-            data_cells = list(
-                map(
-                    lambda column: subscriber[column] if column in user_columns else 0,
-                    columns,
-                )
-            )
-
-            data_cells = list(
-                map(lambda cell: str(cell), data_cells)
-            )
-
-            data_row = ",".join(data_cells)
-            # print(">>>>", data_row)
-            file.write(f"{data_row}\n")
-
+    log_sheet = export_path("subscribers", EXPORT_CSV)
     try:
+        await export_subscribers([STATUS_ACTIVE], log_sheet, EXPORT_CSV)
         logger.debug("Attempt to send document")
         await update.message.reply_document(
             log_sheet,
             caption="subscribers",
             allow_sending_without_reply=True,
-            filename=log_sheet,
+            filename=os.path.basename(log_sheet),
         )
     except Exception as e:
-        print(str(e), flush=True)
+        logger.error(f"[/export] => {str(e)}")
 
 
 async def export_subscribers_full_button(update: Update, context: CallbackContext):
+    """
+    Export every subscriber with every field in ndjson format, the file can be uploaded back.
+    """
     is_not_allowed: bool = await is_banned(update.message.from_user.id)
     if is_not_allowed:
         await update.message.reply_text(
@@ -613,20 +992,12 @@ async def export_subscribers_full_button(update: Update, context: CallbackContex
         )
         return None
 
-    suffix = str(datetime.now().timestamp()).split(".")[0]
-    log_sheet = f"/data/subscribers_full_{suffix}.txt"
-    written: bool = False
-    with open(log_sheet, "w", encoding="utf-8") as file:
-        status = [STATUS_ACTIVE, STATUS_INACTIVE]
-        for _status in status:
-            n: int = await subscriber_service.get_count(_status)
-            subscribers = await subscriber_service.get_all(_status, 0, n)
-            for subscriber in subscribers:
-                file.write(f"{subscriber}\n")
-                written = True
-    if written:
+    log_sheet = export_path("subscribers_full", EXPORT_NDJSON)
+    n_exported: int = await export_subscribers([STATUS_ACTIVE, STATUS_INACTIVE], log_sheet, EXPORT_NDJSON)
+    if n_exported > 0:
         await update.message.reply_document(
-            log_sheet, caption="subscribers", allow_sending_without_reply=True, filename=log_sheet
+            log_sheet, caption="subscribers", allow_sending_without_reply=True,
+            filename=os.path.basename(log_sheet)
         )
     else:
         await update.message.reply_text(
@@ -634,6 +1005,54 @@ async def export_subscribers_full_button(update: Update, context: CallbackContex
         )
 
 
+async def export_feedback_button(update: Update, context: CallbackContext):
+    """
+    Export the feedback of subscribers in csv format.
+
+    Usage:
+        /export_feedback [days], only the feedback of the last `days` days (positive), all of it by default
+
+    Notes:
+        - Streamed from the DB like the subscriber exports, memory does not grow with the feedback count.
+    """
+    is_not_allowed: bool = await is_banned(update.message.from_user.id)
+    if is_not_allowed:
+        await update.message.reply_text(
+            "You are banned from using this bot", parse_mode=ParseMode.HTML
+        )
+        return None
+
+    since: datetime | None = None
+    if context.args:
+        try:
+            days = float(context.args[0])
+            if not days > 0:
+                raise ValueError(f"{days} is not a positive number of days")
+            since = datetime.now() - timedelta(days=days)
+        except (ValueError, OverflowError):
+            await update.message.reply_text(
+                "Usage: /export_feedback [days], days is a positive number", parse_mode=ParseMode.HTML
+            )
+            return None
+
+    log_sheet = export_path("feedback", EXPORT_CSV)
+    writer = ExportWriter(log_sheet, EXPORT_CSV, FEEDBACK_COLUMNS)
+    try:
+        async for batch in feedback_service.iter_batches(config.export_batch_size, since):
+            await writer.write(batch)
+    finally:
+        n_exported: int = await writer.close()
+    if n_exported > 0:
+        await update.message.reply_document(
+            log_sheet, caption=f"feedback: {n_exported}", allow_sending_without_reply=True,
+            filename=os.path.basename(log_sheet)
+        )
+    else:
+        await update.message.reply_text(
+            "No feedback found.", parse_mode=ParseMode.HTML
+        )
+
+
 async def set_upload_subscriber_handler(update: Update, context: CallbackContext):
     """
     Set the bot to accept subscriber loading.
@@ -671,9 +1090,8 @@ async def upload_subscriber(update: Update, context: CallbackContext):
     export_path = ""
     document = getattr(update.message, "document", None)
     filename = getattr(document, "file_name", None)
-    mimetype = getattr(document, "mime_type", None)
     try:
-        val_code, val_msg = val.addText_validation_fn(filename, document, mimetype)
+        val_code, val_msg = val.subscriber_list_validation_fn(filename, document)
         if val_code != 0:
             await update.message.reply_text(val_msg, parse_mode=ParseMode.HTML)
             raise Exception(val_msg)
@@ -682,38 +1100,47 @@ async def upload_subscriber(update: Update, context: CallbackContext):
         stored = await store_to_drive(context, document.file_id, export_path)
         if not stored:
             raise Exception("File download failed.")
-        n_load, n_skip = 0, 0
-        with open(export_path, "r", encoding="utf-8") as file:
+        progress_message = await update.message.reply_text("Importing subscribers...", parse_mode=ParseMode.HTML)
+        suffix = str(datetime.now().timestamp()).split(".")[0]
+        invalid_log = f"/error/import_invalid_{config.bot_id}_{suffix}.csv"
+        n_load, n_skip, n_invalid = 0, 0, 0
+        reported_at = time.monotonic()
+        # Parsing and validation run in a worker thread, one chunk at a time
+        chunks = iter_import_chunks(export_path, config.import_chunk_size)
+        try:
             while True:
-                line = file.readline()
-                if not line:  # EOF
-                    break
-                line = line.strip()
-                if len(line) == 0:  # EOF
+                chunk = await asyncio.to_thread(next, chunks, None)
+                if chunk is None:  # EOF
                     break
-                line = line.replace("'", "\"")
-                line = line.replace('None', '"None"')
-                sub_json: dict = json.loads(line)
-                telegram_id: int | None = sub_json.get("telegram_id")
-                if telegram_id is None:
-                    raise KeyError("telegram_id is None")
-                is_exist = await subscriber_service.exists(telegram_id)
-                if is_exist:
-                    n_skip += 1
-                    continue
-                subscriber: service.subscriber_service.Subscriber = create_subscriber(sub_json)
-                await subscriber_service.add(subscriber)
-                await update_non_standard_columns(subscriber_service, sub_json)
-                n_load += 1
+                rows, invalid_rows = chunk
+                n_inserted, failed_rows = await write_import_rows(subscriber_service, delivery_service, rows)
+                n_load, n_skip = n_load + n_inserted, n_skip + len(rows) - n_inserted - len(failed_rows)
+                invalid_rows += failed_rows
+                if len(invalid_rows) > 0:
+                    n_invalid += len(invalid_rows)
+                    with open(invalid_log, "a", encoding="utf-8") as file:
+                        for line_no, reason in invalid_rows:
+                            file.write(f"{line_no},{reason}\n")
+                if time.monotonic() - reported_at >= config.progress_interval:
+                    reported_at = time.monotonic()
+                    await progress_message.edit_text(
+                        f"Importing subscribers...\nLoaded: {n_load}\nSkipped: {n_skip}\nInvalid: {n_invalid}",
+                        parse_mode=ParseMode.HTML
+                    )
+        finally:
+            chunks.close()
         os.remove(export_path)
-        output_message = f"Loaded: {n_load}\nSkipped: {n_skip}"
-        await update.message.reply_text(output_message, parse_mode=ParseMode.HTML)
+        output_message = f"Loaded: {n_load}\nSkipped: {n_skip}\nInvalid: {n_invalid}"
+        if n_invalid > 0:
+            output_message += f"\nInvalid rows are listed in {invalid_log}"
+        await progress_message.edit_text(output_message, parse_mode=ParseMode.HTML)
         return None
     except TelegramError as tg_err:
         logger.error(f"[/load_subscriber]=TelegramError:{str(tg_err)}")
     except Exception as e:
         logger.error(f"[/load_subscriber]=Exception:{str(e)}")
-    if export_path != "":
+        await update.message.reply_text(f"Import failed.\n{e}", parse_mode=ParseMode.HTML)
+    if export_path != "" and os.path.exists(export_path):
         os.remove(export_path)
 
 
@@ -957,26 +1384,31 @@ async def attachment_handler(update: Update, context: CallbackContext):
         return None
 
     admin: TgUser = update.message.from_user
-    mode: str | None = await admin_service.get_attribute(admin.id, "mode")
-    dtype: str | None = await admin_service.get_attribute(admin.id, "dtype")
+    # Leave the mode up front, so each mode handles exactly one attachment even when several arrive at once.
+    # An import keeps the admin busy until it finished, no broadcast starts against a half-imported list.
+    claimed: dict | None = await admin_service.compare_and_set(
+        admin.id, MODE_LOAD_SUB, mode=MODE_LOADING_SUB, dtype=""
+    )
+    if claimed is None:
+        claimed = await admin_service.compare_and_set(admin.id, MODE_ADD_FILE, mode=MODE_DEFAULT, dtype="")
+    mode: str | None = claimed.get("mode") if claimed is not None else None
+    dtype: str | None = claimed.get("dtype") if claimed is not None else None
 
     if mode == MODE_ADD_FILE:
         if dtype == MODE_ADD_PHOTO:
             await addPhoto(update, context)
-            # reset mode to ensure all attachment are properly handled
-            await admin_service.set_attribute(admin.id, mode=MODE_DEFAULT, dtype="")
             return None
         if dtype == MODE_ADD_DOCUMENT:
             await addDocument(update, context)
-            await admin_service.set_attribute(admin.id, mode=MODE_DEFAULT, dtype="")
             return None
         if dtype == MODE_ADD_VIDEO:
             await addVideo(update, context)
-            await admin_service.set_attribute(admin.id, mode=MODE_DEFAULT, dtype="")
             return None
     if mode == MODE_LOAD_SUB:
-        await upload_subscriber(update, context)
-        await admin_service.set_attribute(admin.id, mode=MODE_DEFAULT)
+        try:
+            await upload_subscriber(update, context)
+        finally:
+            await admin_service.compare_and_set(admin.id, MODE_LOADING_SUB, mode=MODE_DEFAULT, dtype="")
         return None
     await update.message.reply_text("Invalid mode", parse_mode=ParseMode.HTML)
 
@@ -1068,8 +1500,8 @@ async def clearTaskLog(update: Update, context: CallbackContext) -> None:
         return None
 
     task_hash = hx.md5(task_name.encode()).hexdigest()
-    modified_count = await subscriber_service.clear_task_log(task_hash)
-    if modified_count > 0:
+    deleted_count = await delivery_service.reset(task_hash)
+    if deleted_count > 0:
         output_msg = f'Clear log for "{task_name}"'
     else:
         output_msg = f'No log found for "{task_name}"'
@@ -1077,6 +1509,94 @@ async def clearTaskLog(update: Update, context: CallbackContext) -> None:
     return None
 
 
+async def migrate_file_tracking_handler(update: Update, context: CallbackContext) -> None:
+    """
+    Move file tracking fields of subscriber documents into the delivery collection.
+
+    Notes:
+        - Safe to run more than once, subscribers without tracking fields are left untouched.
+    """
+    is_not_allowed: bool = await is_banned(update.message.from_user.id)
+    if is_not_allowed:
+        await update.message.reply_text(
+            "You are banned from using this bot", parse_mode=ParseMode.HTML
+        )
+        return None
+
+    await update.message.reply_text("Migrating file tracking...", parse_mode=ParseMode.HTML)
+    n_subscriber, n_delivery = await migrate_delivery_markers(
+        subscriber_service, delivery_service, config.db_find_limit
+    )
+    await update.message.reply_text(
+        f"Migrated: {n_subscriber} subscribers\nDeliveries: {n_delivery}", parse_mode=ParseMode.HTML
+    )
+
+
+async def index_stats_handler(update: Update, context: CallbackContext) -> None:
+    """
+    Report how often each index was used and how many queries scanned each collection.
+
+    Notes:
+        - A collection with scans but idle indexes points to a query shape without a matching index.
+    """
+    is_not_allowed: bool = await is_banned(update.message.from_user.id)
+    if is_not_allowed:
+        await update.message.reply_text(
+            "You are banned from using this bot", parse_mode=ParseMode.HTML
+        )
+        return None
+
+    try:
+        report: list[dict] = await sf.index_report()
+        lines: list[str] = list()
+        for entry in report:
+            collection_scans = entry["collection_scans"]
+            lines.append(
+                f"<b>{entry['collection']}</b> - collection scans: "
+                f"{'n/a' if collection_scans is None else collection_scans}"
+            )
+            for name, ops, since in entry["indexes"]:
+                lines.append(f"    {html.escape(name)}: {ops} since {since}")
+        await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+    except Exception as e:
+        logger.error(f"[/index_stats] => user: {update.message.from_user.id}, error: {e}")
+        await update.message.reply_text(str(e), parse_mode=ParseMode.HTML)
+
+
+async def db_stats_handler(update: Update, context: CallbackContext) -> None:
+    """
+    Report the connection pool and command counters of the MongoDB client since the bot started.
+
+    Notes:
+        - Checkouts waiting for a connection mean the pool is too small for the load, see MONGODB_MAX_POOL_SIZE.
+    """
+    is_not_allowed: bool = await is_banned(update.message.from_user.id)
+    if is_not_allowed:
+        await update.message.reply_text(
+            "You are banned from using this bot", parse_mode=ParseMode.HTML
+        )
+        return None
+
+    metrics: dict = sf.driver_metrics()
+    pool: dict = metrics["pool"]
+    lines: list[str] = [
+        "<b>pool</b>",
+        f"    checked out: {pool['checked_out']} (max {pool['max_checked_out']})",
+        f"    waiting: {pool['waiting']} (max {pool['max_waiting']})",
+        f"    connections created: {pool['created']}, closed: {pool['closed']}",
+        f"    failed checkouts: {pool['checkout_failed']}, clears: {pool['cleared']}",
+        "<b>commands</b>",
+    ]
+    for name, stats in sorted(metrics["commands"].items(), key=lambda item: -item[1]["started"]):
+        n_done = stats["succeeded"] + stats["failed"]
+        avg_ms = stats["total_ms"] / n_done if n_done > 0 else 0.0
+        lines.append(
+            f"    {html.escape(name)}: {stats['started']} started, {stats['failed']} failed, "
+            f"avg {avg_ms:.1f} ms, max {stats['max_ms']:.1f} ms"
+        )
+    await update.message.reply_text("\n".join(lines), parse_mode=ParseMode.HTML)
+
+
 async def addDocument(update: Update, context: CallbackContext):
     is_not_allowed: bool = await is_banned(update.message.from_user.id)
     if is_not_allowed:
@@ -1232,19 +1752,6 @@ async def set_file_type_handle(update: Update, context: CallbackContext):
         )
         return None
 
-    mode: str = await admin_service.get_attribute(admin.id, "mode")
-    if mode != MODE_ADD_FILE:
-        ready: bool = await admin_service.try_switch_mode(
-            admin.id, MODE_ADD_FILE, MODE_DEFAULT
-        )
-        if ~ready:
-            await context.bot.send_message(
-                admin.id,
-                "Occupied, please try again later",
-                parse_mode=ParseMode.HTML,
-            )
-            return None
-
     query = update.callback_query
     await query.answer()
     choice = query.data.split("|")[1]
@@ -1265,8 +1772,11 @@ async def set_file_type_handle(update: Update, context: CallbackContext):
 
     output_msg = "Invalid choice."
     if choice in output_dict.keys():
-        await admin_service.set_attribute(admin.id, dtype=choice)
-        output_msg = f"{output_dict[choice]}"
+        # Stay in or switch to add file mode and set the file type in one step
+        ready: bool = await admin_service.try_switch_mode(
+            admin.id, MODE_ADD_FILE, [MODE_ADD_FILE, MODE_DEFAULT], dtype=choice
+        )
+        output_msg = f"{output_dict[choice]}" if ready else "Occupied, please try again later"
 
     await context.bot.send_message(admin.id, output_msg, parse_mode=ParseMode.HTML,)
 
@@ -0,0 +1,72 @@
+import asyncio
+import logging
+from typing import Any, Awaitable, Callable
+
+logger = logging.getLogger(__name__)
+
+
+class BufferedBulkWriter:
+    """
+    Buffer write requests and hand them to `write_fn` in batches.
+
+    A batch is flushed when `max_size` requests are buffered or `max_delay` seconds after the first request
+    of the batch arrived, whichever comes first. `close` flushes whatever is left and must be awaited once
+    the producer is done.
+
+    Notes:
+    - `write_fn` is expected to perform an unordered bulk write and return the number of affected documents.
+    - Batches are written one at a time, in the order they were filled.
+    - Requests of a failed batch are kept and retried with the next one, `write_fn` must be idempotent.
+    """
+
+    def __init__(
+            self, write_fn: Callable[[list[Any]], Awaitable[int]], max_size: int = 500, max_delay: float = 1.0
+    ):
+        assert max_size > 0, "max_size must be positive"
+        self.__write_fn = write_fn
+        self.__max_size = max_size
+        self.__max_delay = max_delay
+        self.__buffer: list[Any] = list()
+        self.__lock = asyncio.Lock()
+        self.__timer: asyncio.Task | None = None
+        self.__n_written = 0
+
+    @property
+    def n_written(self) -> int:
+        return self.__n_written
+
+    async def __flush_later(self) -> None:
+        await asyncio.sleep(self.__max_delay)
+        self.__timer = None
+        try:
+            await self.flush()
+        except Exception as err:
+            logger.error(f"[BufferedBulkWriter] => flush failed, {len(self.__buffer)} pending: {err}")
+
+    async def add(self, request: Any) -> None:
+        self.__buffer.append(request)
+        if len(self.__buffer) >= self.__max_size:
+            await self.flush()
+        elif self.__timer is None:
+            self.__timer = asyncio.ensure_future(self.__flush_later())
+
+    async def flush(self) -> int:
+        async with self.__lock:
+            if len(self.__buffer) == 0:
+                return 0
+            batch, self.__buffer = self.__buffer, list()
+            try:
+                n = await self.__write_fn(batch)
+            except Exception:
+                self.__buffer = batch + self.__buffer
+                if self.__timer is None:
+                    self.__timer = asyncio.ensure_future(self.__flush_later())
+                raise
+            self.__n_written += n
+            return n
+
+    async def close(self) -> int:
+        if self.__timer is not None:
+            self.__timer.cancel()
+            self.__timer = None
+        return await self.flush()
@@ -0,0 +1,195 @@
+import asyncio
+import time
+from typing import Awaitable, Callable, TypeVar
+
+from telegram.error import RetryAfter
+
+R = TypeVar("R")
+
+
+class TokenBucket:
+    """
+    Asynchronous token bucket.
+
+    Tokens are refilled continuously at `rate` tokens per second up to `capacity`.
+    `acquire` waits until one token is available, so callers are released at no more than `rate`
+    per second on average while short bursts up to `capacity` are allowed.
+    The rate can be changed at runtime and the bucket can be paused, e.g. while Telegram asks us to wait.
+    """
+
+    def __init__(self, rate: float, capacity: float | None = None):
+        assert rate > 0, "rate must be positive"
+        self.__rate = float(rate)
+        self.__capacity = float(capacity if capacity is not None else rate)
+        self.__tokens = self.__capacity
+        self.__updated_at = time.monotonic()
+        self.__paused_until = 0.0
+        self.__lock = asyncio.Lock()
+
+    @property
+    def rate(self) -> float:
+        return self.__rate
+
+    def set_rate(self, rate: float) -> None:
+        assert rate > 0, "rate must be positive"
+        self.__refill()
+        self.__rate = float(rate)
+
+    def pause(self, seconds: float) -> None:
+        """
+        Release nothing for `seconds`, the bucket restarts empty afterward.
+        """
+        self.__refill()
+        self.__tokens = 0.0
+        self.__paused_until = max(self.__paused_until, time.monotonic() + seconds)
+
+    def __refill(self) -> None:
+        now = time.monotonic()
+        elapsed = max(0.0, now - max(self.__updated_at, self.__paused_until))
+        self.__updated_at = now
+        self.__tokens = min(self.__capacity, self.__tokens + elapsed * self.__rate)
+
+    async def acquire(self) -> None:
+        async with self.__lock:
+            while True:
+                now = time.monotonic()
+                if now < self.__paused_until:
+                    await asyncio.sleep(self.__paused_until - now)
+                    continue
+                self.__refill()
+                if self.__tokens >= 1.0:
+                    self.__tokens -= 1.0
+                    return None
+                await asyncio.sleep((1.0 - self.__tokens) / self.__rate)
+
+
+class ChatRateLimiter:
+    """
+    Enforce a minimum interval between two sends to the same chat.
+
+    Telegram allows roughly one message per second per chat. The last send time of every chat is kept in
+    memory and entries older than the interval are dropped periodically, so the footprint is bounded by
+    the number of chats served within the last `interval` seconds.
+    """
+
+    def __init__(self, interval: float):
+        self.__interval = float(interval)
+        self.__last_sent: dict[int, float] = dict()
+        self.__last_pruned = time.monotonic()
+
+    def __prune(self, now: float) -> None:
+        if now - self.__last_pruned < self.__interval:
+            return None
+        self.__last_pruned = now
+        expired = [chat_id for chat_id, t in self.__last_sent.items() if now - t >= self.__interval]
+        for chat_id in expired:
+            del self.__last_sent[chat_id]
+
+    async def acquire(self, chat_id: int) -> None:
+        if self.__interval <= 0.0:
+            return None
+        while True:
+            now = time.monotonic()
+            self.__prune(now)
+            last = self.__last_sent.get(chat_id)
+            if last is None or now - last >= self.__interval:
+                self.__last_sent[chat_id] = now
+                return None
+            await asyncio.sleep(self.__interval - (now - last))
+
+
+class AIMDController:
+    """
+    Adapt the rate of a token bucket to the throughput Telegram accepts (additive increase, multiplicative
+    decrease).
+
+    - Every successful send raises the rate by `increase / rate`, about `increase` msg/s per second of
+      sustained sending, up to `max_rate`.
+    - A flood wait (RetryAfter) pauses the bucket for the requested time and multiplies the rate by
+      `decrease`, down to `min_rate`. Flood waits reported by sends that were already in flight when the
+      rate was cut do not cut it again.
+    """
+
+    def __init__(
+            self, bucket: TokenBucket, min_rate: float, max_rate: float,
+            increase: float = 1.0, decrease: float = 0.5
+    ):
+        assert 0 < min_rate <= max_rate, "expect 0 < min_rate <= max_rate"
+        assert 0 < decrease < 1, "decrease must be within (0, 1)"
+        self.__bucket = bucket
+        self.__min_rate = float(min_rate)
+        self.__max_rate = float(max_rate)
+        self.__increase = float(increase)
+        self.__decrease = float(decrease)
+        self.__decreased_until = 0.0
+
+    @property
+    def rate(self) -> float:
+        return self.__bucket.rate
+
+    def on_success(self) -> None:
+        rate = self.__bucket.rate
+        if rate < self.__max_rate:
+            self.__bucket.set_rate(min(self.__max_rate, rate + self.__increase / rate))
+
+    def on_retry_after(self, seconds: float) -> None:
+        now = time.monotonic()
+        self.__bucket.pause(seconds)
+        if now < self.__decreased_until:
+            return None
+        self.__bucket.set_rate(max(self.__min_rate, self.__bucket.rate * self.__decrease))
+        self.__decreased_until = now + seconds
+
+
+class Dispatcher:
+    """
+    Run send operations concurrently under a global rate budget.
+
+    Three limits are applied to every call:
+    - at most `max_concurrency` calls are in flight at once
+    - a global token bucket releases at most `global_rate` calls per second
+    - two calls targeting the same chat are at least `1 / per_chat_rate` seconds apart
+
+    The global rate starts at `global_rate` and is adapted by an `AIMDController` between `min_rate` and
+    `global_rate`. A call raising RetryAfter is retried after the requested wait, up to `max_retries` times.
+
+    Notes:
+    - The dispatcher is bound to the event loop it is first used in.
+    - Send functions are expected to handle their own errors and only let RetryAfter through.
+    """
+
+    def __init__(
+            self, max_concurrency: int, global_rate: float, per_chat_rate: float = 1.0,
+            min_rate: float = 1.0, max_retries: int = 5
+    ):
+        assert max_concurrency > 0, "max_concurrency must be positive"
+        self.__semaphore = asyncio.Semaphore(max_concurrency)
+        self.__bucket = TokenBucket(global_rate)
+        self.__controller = AIMDController(self.__bucket, min(min_rate, global_rate), global_rate)
+        self.__chat_limiter = ChatRateLimiter(1.0 / per_chat_rate if per_chat_rate > 0 else 0.0)
+        self.__max_retries = max_retries
+
+    @property
+    def rate(self) -> float:
+        return self.__controller.rate
+
+    async def run(self, chat_id: int, fn: Callable[[], Awaitable[R]]) -> R:
+        """
+        Raises:
+        - RetryAfter: If Telegram still asks to wait after `max_retries` retries.
+        """
+        async with self.__semaphore:
+            n_retry = 0
+            while True:
+                await self.__chat_limiter.acquire(chat_id)
+                await self.__bucket.acquire()
+                try:
+                    result = await fn()
+                except RetryAfter as retry_after:
+                    self.__controller.on_retry_after(float(retry_after.retry_after))
+                    if n_retry >= self.__max_retries:
+                        raise
+                    n_retry += 1
+                    continue
+                self.__controller.on_success()
+                return result
@@ -0,0 +1,90 @@
+import asyncio
+import csv
+import gzip
+import json
+import queue
+import threading
+from typing import IO
+
+EXPORT_CSV = "csv"
+EXPORT_NDJSON = "ndjson"
+
+
+def open_export_file(path: str) -> IO[str]:
+    """
+    Open an export file for writing as text, gzip is picked by the ".gz" extension.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "wt", encoding="utf-8", newline="")
+    return open(path, "w", encoding="utf-8", newline="")
+
+
+class ExportWriter:
+    """
+    Write batches of documents to a CSV or NDJSON file from a background thread.
+
+    The event loop hands batches over through a bounded queue and only waits when the thread falls
+    `max_pending` batches behind, so at most that many batches are held in memory whatever the export size.
+
+    Notes:
+    - CSV holds `columns` only, missing cells are left empty. NDJSON holds every field.
+    """
+
+    def __init__(self, path: str, export_format: str, columns: list[str], max_pending: int = 4):
+        if export_format not in [EXPORT_CSV, EXPORT_NDJSON]:
+            raise ValueError(f"Unsupported export format: {export_format}")
+        self.__path = path
+        self.__format = export_format
+        self.__columns = columns
+        self.__queue: queue.Queue[list[dict] | None] = queue.Queue(maxsize=max_pending)
+        self.__n_written = 0
+        self.__error: Exception | None = None
+        self.__thread = threading.Thread(target=self.__run, name=f"export:{path}", daemon=True)
+        self.__thread.start()
+
+    @property
+    def path(self) -> str:
+        return self.__path
+
+    def __run(self) -> None:
+        try:
+            with open_export_file(self.__path) as file:
+                if self.__format == EXPORT_CSV:
+                    writer = csv.DictWriter(file, self.__columns, restval="", extrasaction="ignore")
+                    writer.writeheader()
+                    write_batch = writer.writerows
+                else:
+                    def write_batch(batch: list[dict]) -> None:
+                        file.writelines(
+                            json.dumps(document, ensure_ascii=False, default=str) + "\n" for document in batch
+                        )
+                while (batch := self.__queue.get()) is not None:
+                    write_batch(batch)
+                    self.__n_written += len(batch)
+        except Exception as err:
+            self.__error = err
+            # Keep draining so the event loop never blocks on a full queue
+            while self.__queue.get() is not None:
+                pass
+
+    async def write(self, batch: list[dict]) -> None:
+        try:
+            self.__queue.put_nowait(batch)
+        except queue.Full:
+            await asyncio.to_thread(self.__queue.put, batch)
+
+    async def close(self) -> int:
+        """
+        Wait for every batch to be written.
+
+        Returns:
+            int: number of subscribers written
+
+        Raises:
+            Exception: The error met by the writer thread, if any
+        """
+        await asyncio.to_thread(self.__queue.put, None)
+        await asyncio.to_thread(self.__thread.join)
+        if self.__error is not None:
+            raise self.__error
+        return self.__n_written
@@ -0,0 +1,86 @@
+from typing import IO
+
+OUTCOME_SENT = 0
+OUTCOME_FAILED = 1
+
+
+class SendOutcome:
+    """
+    Outcome of sending to one subscriber.
+
+    `error_class` is the exception name of the error string returned by the send functions
+    ("<telegram_id>=<ErrorClass>:<message>"), e.g. Forbidden for a subscriber who blocked the bot or BadRequest,
+    "" when sent.
+    """
+    __slots__ = ("telegram_id", "username", "status", "error_class", "error")
+
+    def __init__(self, telegram_id: int, username: str, error: str | None):
+        self.telegram_id = telegram_id
+        self.username = username
+        if error is None:
+            self.status, self.error_class, self.error = OUTCOME_SENT, "", ""
+        else:
+            self.status, self.error = OUTCOME_FAILED, error
+            head = error.split(":", 1)[0]
+            self.error_class = head.split("=", 1)[-1] if ":" in error else "Unknown"
+
+    def dump(self) -> str:
+        template: str = '"id": "{id}", "name": "{name}", "result": "{result}"'
+        content_string = template.format(id=self.telegram_id, name=self.username, result=self.error)
+        return "{" + content_string + "}"
+
+
+class OutcomeAggregator:
+    """
+    Count send outcomes as they arrive and spill the failures to a log file.
+
+    Outcomes are not kept, memory does not grow with the audience. The log file is opened on the first failure
+    and starts with `header`.
+
+    Notes:
+    - Failures are buffered by the file, `flush` at checkpoints, `close` once the broadcast is done.
+    """
+
+    def __init__(self, log_path: str, header: str):
+        self.__log_path = log_path
+        self.__header = header
+        self.__file: IO | None = None
+        self.__n_sent = 0
+        self.__n_failed = 0
+        self.__error_counts: dict[str, int] = dict()
+
+    @property
+    def n_sent(self) -> int:
+        return self.__n_sent
+
+    @property
+    def n_failed(self) -> int:
+        return self.__n_failed
+
+    @property
+    def error_counts(self) -> dict[str, int]:
+        """
+        Number of failures per error class.
+        """
+        return dict(self.__error_counts)
+
+    def add(self, outcome: SendOutcome) -> None:
+        if outcome.status == OUTCOME_SENT:
+            self.__n_sent += 1
+            return None
+        self.__n_failed += 1
+        self.__error_counts[outcome.error_class] = self.__error_counts.get(outcome.error_class, 0) + 1
+        if self.__file is None:
+            self.__file = open(self.__log_path, "a")
+            self.__file.write(f"{self.__header}\n")
+        self.__file.write(f"{outcome.dump()}\n")
+
+    def flush(self) -> None:
+        if self.__file is not None:
+            self.__file.flush()
+
+    def close(self) -> None:
+        if self.__file is None:
+            return None
+        self.__file.close()
+        self.__file = None
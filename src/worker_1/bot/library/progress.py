@@ -0,0 +1,77 @@
+import asyncio
+import time
+from typing import Awaitable, Callable
+
+
+class ProgressReporter:
+    """
+    Periodically render the progress of a long-running job through `render_fn`.
+
+    The job reports its counters with `update`, a background task renders them every `interval` seconds
+    when they changed, together with the current rate and the estimated time to completion.
+
+    Notes:
+    - `total` is an estimate, the ETA is omitted once the job goes past it.
+    - Errors raised by `render_fn` are swallowed, progress is best effort.
+    """
+
+    def __init__(
+            self, render_fn: Callable[[str], Awaitable[object]], title: str, total: int, interval: float = 10.0
+    ):
+        self.__render_fn = render_fn
+        self.__title = title
+        self.__total = total
+        self.__interval = interval
+        self.__n_success = 0
+        self.__n_failed = 0
+        self.__n_start = 0
+        self.__started_at = time.monotonic()
+        self.__rendered: str | None = None
+        self.__task: asyncio.Task | None = None
+
+    def update(self, n_success: int, n_failed: int) -> None:
+        self.__n_success, self.__n_failed = n_success, n_failed
+
+    def render(self) -> str:
+        n_done = self.__n_success + self.__n_failed
+        elapsed = time.monotonic() - self.__started_at
+        rate = (n_done - self.__n_start) / elapsed if elapsed > 0 else 0.0
+        lines = [
+            self.__title,
+            f"Sent: {self.__n_success}",
+            f"Failed: {self.__n_failed}",
+            f"Progress: {n_done}/{self.__total}",
+            f"Rate: {rate:.1f} msg/s",
+        ]
+        if rate > 0 and n_done < self.__total:
+            lines.append(f"ETA: {int((self.__total - n_done) / rate)} seconds")
+        return "\n".join(lines)
+
+    async def __loop(self) -> None:
+        while True:
+            await asyncio.sleep(self.__interval)
+            await self.flush()
+
+    async def flush(self) -> None:
+        text = self.render()
+        if text == self.__rendered:
+            return None
+        try:
+            await self.__render_fn(text)
+            self.__rendered = text
+        except Exception:
+            pass
+
+    def start(self, n_success: int = 0, n_failed: int = 0) -> None:
+        """
+        Start rendering, counters already reached by a resumed job are excluded from the rate.
+        """
+        self.update(n_success, n_failed)
+        self.__n_start = n_success + n_failed
+        self.__started_at = time.monotonic()
+        self.__task = asyncio.ensure_future(self.__loop())
+
+    async def stop(self) -> None:
+        if self.__task is not None:
+            self.__task.cancel()
+            self.__task = None
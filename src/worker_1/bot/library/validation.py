@@ -99,6 +99,23 @@ def addVideo_validation_fn(filename, document, mimetype: str) -> tuple[int, str]
     return 0, "None"
 
 
+def subscriber_list_validation_fn(filename, document) -> tuple[int, str]:
+    """
+    Validate an uploaded subscriber list, accepted formats are NDJSON (or the export format) and CSV,
+    optionally gzipped.
+    """
+    if filename is None:
+        return 1, "Please try again. Filename is missing."
+    if not is_valid_fileName(filename):
+        return 2, "Please try again. Filename is missing."
+    if document is None:
+        return 3, "Please try again. Only accept document."
+    extension = filename.lower().removesuffix(".gz").split(".")[-1]
+    if extension not in ["txt", "json", "jsonl", "ndjson", "csv"]:
+        return 4, "Only .txt, .ndjson and .csv files are acceptable, optionally gzipped."
+    return 0, "None"
+
+
 def addText_validation_fn(filename, document, mimetype: str) -> tuple[int, str]:
     if filename is None:
         return 1, "Please try again. Filename is missing."
@@ -1,11 +1,17 @@
 # external library
-from queue import Queue
-from typing import Any
+import hashlib as hx
+import re
+from typing import Any, AsyncIterator
 from telegram import Update, Message
 # internal library
 import service
-# data class
-from data_class.dtype import JobSentInformation
+from library.bulk_writer import BufferedBulkWriter
+import library.filesystem as fs
+import library.validation as val
+from library.outcome import OUTCOME_SENT, OutcomeAggregator, SendOutcome
+
+# Media files used to be tracked as `hashcode: 1` fields on subscriber documents
+HASHCODE_PATTERN = re.compile(r"^[0-9a-f]{32}$")
 
 
 def extract_forwarded_sender_info(update: Update) -> str | None:
@@ -52,55 +58,107 @@ username: {username}
     return output_msg if found else None
 
 
-def is_job_done(subscriber: Any, hashcode: str) -> bool:
+async def set_job_as_done(
+        writer: BufferedBulkWriter, subscriber_id: int, hashcode: str
+) -> None:
     """
-    Check whether the same media file was sent to this subscriber.
+    Mark the media file as sent.
 
     Notes:
     - media file is identified by its hashcode
     - two file with identical hashcode will be considered the same file
     - two identical file with different hashcode (due to different file name) will be considered different file.
+    - the marker is buffered, it reaches the DB when the writer flushes
+    - resumed partitions read the markers back to skip subscribers already served, see `skip_delivered`
+    """
+    await writer.add(service.delivery_service.DeliveryService.mark_request(hashcode, subscriber_id))
 
-    Return:
-    - condition (bool): True if the media file was sent to this subscriber, False otherwise
 
-    @Warning: Never attempt to get value directly, KeyError can be very scary!!
+async def record_outcome(
+        outcomes: OutcomeAggregator, writer: BufferedBulkWriter, job_hash: str,
+        subscriber_id: int, username: str, error: str | None
+) -> None:
+    """
+    Count the outcome of one send, an error of None means the content was sent and the job is marked as done.
     """
-    if hashcode not in subscriber.keys():
-        return False
-    return subscriber[hashcode] == 1
+    outcome = SendOutcome(subscriber_id, username, error)
+    outcomes.add(outcome)
+    if outcome.status == OUTCOME_SENT:
+        await set_job_as_done(writer, subscriber_id, job_hash)
 
 
-async def set_job_as_done(
-        ss: service.subscriber_service.SubscriberService, subscriber_id: int, hashcode: str
-) -> None:
+async def skip_delivered(
+        ds: service.delivery_service.DeliveryService, pages: AsyncIterator[list[dict]], job_hash: str
+) -> AsyncIterator[list[dict]]:
     """
-    Mark the media file as sent.
+    Drop the subscribers who already received the job from pages of subscribers, one indexed lookup per page.
 
     Notes:
-    - media file is identified by its hashcode
-    - two file with identical hashcode will be considered the same file
-    - two identical file with different hashcode (due to different file name) will be considered different file.
+        - A resumed partition restarts from its last checkpoint, markers of the batch that was in flight may have
+          been flushed already, as may those of a worker whose lease was taken over while it was still sending.
+        - Pages left empty are not yielded.
     """
-    await ss.set_attribute(subscriber_id, _key=hashcode, _value=1)
+    async for page in pages:
+        delivered = await ds.delivered_among(job_hash, [subscriber["telegram_id"] for subscriber in page])
+        if len(delivered) > 0:
+            page = [subscriber for subscriber in page if subscriber["telegram_id"] not in delivered]
+        if len(page) > 0:
+            yield page
 
 
-def write_sent_result(log_sheet_path: str, job_information_list: list[JobSentInformation], content: str) -> None:
+async def migrate_delivery_markers(
+        ss: service.subscriber_service.SubscriberService,
+        ds: service.delivery_service.DeliveryService,
+        page_size: int
+) -> tuple[int, int]:
     """
-    Write job sent information to the log sheet.
+    Move `hashcode: 1` fields of subscriber documents into the delivery collection.
 
-    Args:
-        log_sheet_path (sheet): path to the log sheet
-        job_information_list (list[JobSentInformation]): failed jobs information
-        content (str): job content expected to be sent
+    Notes:
+        - Deliveries are written before the fields are removed, an interrupted migration can be run again.
+        - `hashcode: 0` fields (reset file tracking) are removed without creating a delivery.
 
     Return:
-        None
+        (n_subscriber, n_delivery): number of subscribers migrated and deliveries created
+    """
+    n_subscriber, n_delivery = 0, 0
+    async for subscribers in ss.iter_pages(None, page_size, None):
+        delivery_requests, unset_requests = list(), list()
+        for subscriber in subscribers:
+            hashcodes = list(filter(lambda key: HASHCODE_PATTERN.match(key), subscriber.keys()))
+            if len(hashcodes) == 0:
+                continue
+            subscriber_id = subscriber["telegram_id"]
+            for hashcode in hashcodes:
+                if subscriber[hashcode] == 1:
+                    delivery_requests.append(ds.mark_request(hashcode, subscriber_id))
+            unset_requests.append(ss.unset_attribute_request(subscriber_id, *hashcodes))
+        n_delivery += await ds.bulk_write(delivery_requests)
+        await ss.bulk_write(unset_requests)
+        n_subscriber += len(unset_requests)
+    return n_subscriber, n_delivery
+
+
+def compute_content_key(bot_token: str, dtype: str, filename_or_url: str) -> str:
     """
-    with open(log_sheet_path, "a") as file:
-        file.write(f"Content:{content}\n")
-        for jsi in job_information_list:
-            file.write(f"{jsi.dump()}\n")
+    Identify media content for the file_id cache.
+
+    Notes:
+    - local files are identified by the sha256 of their content, renamed copies share one entry
+    - URLs are identified by the URL itself
+    - file_id is only valid for the bot that uploaded the file, the bot id is part of the key
+    - reads the whole file, call it off the event loop
+    """
+    digest = hx.sha256()
+    found, path = (False, "") if val.isURL(filename_or_url) else fs.find_file(filename_or_url, "/online")
+    if found:
+        with open(path, "rb") as file:
+            for block in iter(lambda: file.read(1 << 20), b""):
+                digest.update(block)
+    else:
+        digest.update(filename_or_url.encode())
+    bot_id = bot_token.split(":")[0]
+    return f"{bot_id}:{dtype}:{digest.hexdigest()}"
 
 
 def create_subscriber(
@@ -121,26 +179,6 @@ def create_subscriber(
     return subscriber
 
 
-async def update_non_standard_columns(
-        ss: service.subscriber_service.SubscriberService,
-        inp: dict
-) -> None:
-    """
-    Update the value to non-standard columns to DB.
-
-    Notes:
-        - Mostly are hash_code of media files
-    """
-    standard_columns: list[str] = [
-        "telegram_id", "chat_id", "username", "mode", "status", "n_feedback", "feedback", "reg_datetime"
-    ]
-    columns = list(filter(lambda column: column not in standard_columns, inp.keys()))
-    for col in columns:
-        await ss.set_attribute(
-            inp.get("telegram_id"), _key=col, _value=inp.get(col)
-        )
-
-
 def patch_extension(filename: str):
     parts = filename.split(".")
     if len(parts) >= 2:
@@ -151,39 +189,6 @@ def patch_extension(filename: str):
     return filename + ".jpg"
 
 
-def group_by_result(
-        result_queue: Queue[JobSentInformation], is_apply_result: bool
-) -> tuple[list[JobSentInformation], list[JobSentInformation]]:
-    sent_list, failed_list = list(), list()
-    while result_queue.qsize():
-        item = result_queue.get()
-        sid, uname, result = item.to_tuple()
-        if is_apply_result:
-            result = result.get()
-        if type(result) is Message:
-            sent_list.append(JobSentInformation(sid, uname, str(result)))
-        else:
-            failed_list.append(JobSentInformation(sid, uname, result))
-
-    return sent_list, failed_list
-
-
-def group_by_result_list(
-        result_list: list[JobSentInformation], is_apply_result: bool
-) -> tuple[list[JobSentInformation], list[JobSentInformation]]:
-    sent_list, failed_list = list(), list()
-    for job_result in result_list:
-        sid, uname, result = job_result.to_tuple()
-        if is_apply_result:
-            result = result.get()
-        if type(result) is Message:
-            sent_list.append(JobSentInformation(sid, uname, str(result)))
-        else:
-            failed_list.append(JobSentInformation(sid, uname, result))
-
-    return sent_list, failed_list
-
-
 def split_text_into_chunks(text, chunk_size):
     for i in range(0, len(text), chunk_size):
         yield text[i: i + chunk_size]
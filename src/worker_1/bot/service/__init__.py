@@ -1,15 +1,38 @@
+import logging
 from motor.motor_asyncio import AsyncIOMotorClient, AsyncIOMotorDatabase, AsyncIOMotorCollection
 import pymongo
-from . import admin_service, subscriber_service, super_service
+from . import admin_service, subscriber_service, super_service, media_cache_service, delivery_service, job_service, \
+    partition_service, counter_service, feedback_service, snapshot_service, mongo_client, memory_backend
 
-COLLECTIONS_NAME = ["subscriber", "admin", "super"]
+logger = logging.getLogger(__name__)
+
+STORAGE_MONGO = "mongo"
+STORAGE_MEMORY = "memory"
+
+COLLECTIONS_NAME = ["subscriber", "admin", "super", "media_cache", delivery_service.DELIVERY_COLLECTION, "job", "job_partition",
+                    counter_service.COUNTER_COLLECTION, feedback_service.FEEDBACK_COLLECTION,
+                    snapshot_service.SNAPSHOT_COLLECTION]
 
 
 class ServiceFactory:
-    def __init__(self, db_uri: str, bot_id: int = None, database_name: str = ""):
-        self.__client = AsyncIOMotorClient(db_uri)
+    def __init__(
+            self, db_uri: str, bot_id: int = None, database_name: str = "", allow_list_refresh_seconds: float = 30.0,
+            subscriber_count_mode: str = subscriber_service.COUNT_MODE_COUNTER, client_options: dict | None = None,
+            storage_backend: str = STORAGE_MONGO, snapshot_chunk_size: int = 50000
+    ):
+        self.__client: AsyncIOMotorClient | memory_backend.MemoryClient
+        if storage_backend == STORAGE_MEMORY:
+            # Same collection API without a mongod, see `memory_backend`
+            self.__client = memory_backend.MemoryClient()
+        elif storage_backend == STORAGE_MONGO:
+            self.__client = mongo_client.get_client(db_uri, client_options)
+        else:
+            raise ValueError(f"{storage_backend} is not a valid storage backend")
         self.__db: AsyncIOMotorDatabase = self.__client[database_name]
         self.__bot_id = bot_id
+        self.__allow_list_refresh_seconds = allow_list_refresh_seconds
+        self.__subscriber_count_mode = subscriber_count_mode
+        self.__snapshot_chunk_size = snapshot_chunk_size
 
     def get_collection(self, collection_name: str) -> AsyncIOMotorCollection:
         if collection_name not in COLLECTIONS_NAME:
@@ -21,7 +44,77 @@ class ServiceFactory:
         if service_name == "admin":
             return admin_service.AdminService(self.get_collection(service_name), self.__bot_id)
         elif service_name == "subscriber":
-            return subscriber_service.SubscriberService(self.get_collection(service_name))
+            return subscriber_service.SubscriberService(
+                self.get_collection(service_name), self.get_service(counter_service.COUNTER_COLLECTION),
+                self.__subscriber_count_mode
+            )
         elif service_name == "super":
-            return super_service.SuperService(self.get_collection(service_name))
+            return super_service.SuperService(self.get_collection(service_name), self.__allow_list_refresh_seconds)
+        elif service_name == "media_cache":
+            return media_cache_service.MediaCacheService(self.get_collection(service_name))
+        elif service_name == delivery_service.DELIVERY_COLLECTION:
+            return delivery_service.DeliveryService(self.get_collection(service_name))
+        elif service_name == "job":
+            return job_service.JobService(self.get_collection(service_name))
+        elif service_name == "job_partition":
+            return partition_service.PartitionService(self.get_collection(service_name))
+        elif service_name == counter_service.COUNTER_COLLECTION:
+            return counter_service.CounterService(self.get_collection(service_name))
+        elif service_name == feedback_service.FEEDBACK_COLLECTION:
+            return feedback_service.FeedbackService(self.get_collection(service_name))
+        elif service_name == snapshot_service.SNAPSHOT_COLLECTION:
+            return snapshot_service.SnapshotService(self.get_collection(service_name), self.__snapshot_chunk_size)
         return None
+
+    async def ensure_indexes(self) -> None:
+        """
+        Create the indexes of every collection, safe to call at every start.
+
+        Notes:
+        - A collection whose indexes cannot be built (e.g. duplicates under a unique index) is logged and
+          skipped, its queries fall back to collection scans.
+        """
+        for collection_name in COLLECTIONS_NAME:
+            try:
+                await self.get_service(collection_name).ensure_indexes()
+            except pymongo.errors.OperationFailure as err:
+                logger.error(f"[ensure_indexes] => collection: {collection_name}, error: {err}")
+
+    async def index_report(self) -> list[dict]:
+        """
+        Collect how often each index was used and how many queries scanned each collection.
+
+        Returns:
+            list[dict]: one entry per collection, with
+                - collection (str)
+                - indexes (list[tuple[str, int, datetime]]): index name, number of uses and since when
+                - collection_scans (int | None): None if the server does not report it
+
+        Notes:
+        - Counters are kept in memory by the server and restart with mongod.
+        - Collection scans are reported by MongoDB 6.0 and above.
+        """
+        report: list[dict] = list()
+        for collection_name in COLLECTIONS_NAME:
+            collection = self.get_collection(collection_name)
+            index_cursor = collection.aggregate([{"$indexStats": {}}])
+            indexes = [
+                (stats["name"], stats["accesses"]["ops"], stats["accesses"]["since"])
+                async for stats in index_cursor
+            ]
+            collection_scans: int | None = None
+            try:
+                stats_cursor = collection.aggregate([{"$collStats": {"queryExecStats": {}}}])
+                async for stats in stats_cursor:
+                    collection_scans = stats["queryExecStats"]["collectionScans"]["total"]
+            except (pymongo.errors.OperationFailure, KeyError):
+                pass
+            report.append({"collection": collection_name, "indexes": indexes, "collection_scans": collection_scans})
+        return report
+
+    @staticmethod
+    def driver_metrics() -> dict:
+        """
+        Connection pool and command counters of the MongoDB client of this process, see `DriverMetrics`.
+        """
+        return mongo_client.metrics.snapshot()
@@ -2,6 +2,8 @@ from dataclasses import dataclass
 from typing import Any
 from datetime import datetime
 from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+from pymongo import ReturnDocument
 
 
 @dataclass
@@ -29,6 +31,10 @@ class AdminService:
         self.__collection = collection
         self.__id = bot_id
 
+    async def ensure_indexes(self) -> None:
+        # telegram_id holds "id|bot", one document per admin and worker bot
+        await self.__collection.create_index("telegram_id", name="telegram_id", unique=True)
+
     async def exists(self, admin_id: int, raise_exception: bool = False) -> bool:
         count = await self.__collection.count_documents({'telegram_id': self.preprocess_id(admin_id)})
         if count > 0:
@@ -42,35 +48,67 @@ class AdminService:
         if is_exists:
             return None
         admin.tel_id = self.preprocess_id(admin.tel_id)
-        await self.__collection.insert_one(admin.to_dict())
+        try:
+            await self.__collection.insert_one(admin.to_dict())
+        except pymongo.errors.DuplicateKeyError:
+            # Registered concurrently
+            return None
 
     async def get_attribute(self, admin_id: int, key: str) -> Any | None:
         assert len(key) > 0, "Encounter empty string"
-        await self.exists(admin_id, True)
-        document = await self.__collection.find_one(
-            {'telegram_id': self.preprocess_id(admin_id)},
-            {key: 1}
-        )
-        if document:
-            if key in document:
-                return document[key]
-        return None
+        document = await self.get_attributes(admin_id, key)
+        return document.get(key)
+
+    async def get_attributes(self, admin_id: int, *keys: str) -> dict:
+        """
+        Fetch several fields of an admin in one query.
+
+        Raises:
+            ValueError: If the admin does not exist
+        """
+        projection = {"_id": 0}
+        for key in keys:
+            projection[key] = 1
+        document = await self.__collection.find_one({'telegram_id': self.preprocess_id(admin_id)}, projection)
+        if document is None:
+            raise ValueError(f"{admin_id} does not exists")
+        return document
 
     async def set_attribute(self, admin_id: int, **key_value_pair) -> int:
-        await self.exists(admin_id, True)
         # TODO Detect invalid key
         result = await self.__collection.update_one(
             {'telegram_id': self.preprocess_id(admin_id)},
             {'$set': key_value_pair}
         )
+        if result.matched_count == 0:
+            raise ValueError(f"{admin_id} does not exists")
         return result.modified_count
 
     def preprocess_id(self, admin_id: int) -> str:
         return f"{admin_id}|{self.__id}"
 
-    async def try_switch_mode(self, admin_id: int, mode: str, default: str) -> bool:
-        current_mode: str = await self.get_attribute(admin_id, "mode")
-        if current_mode == default:
-            await self.set_attribute(admin_id, mode=mode)
-            return True
-        return False
+    async def compare_and_set(
+            self, admin_id: int, expected_mode: str | list[str], **key_value_pair
+    ) -> dict | None:
+        """
+        Atomically set `key_value_pair` if the admin's mode is `expected_mode` (or one of them).
+
+        Returns:
+            dict | None: mode and dtype before the update, None if the mode did not match
+        """
+        mode_filter = {"$in": expected_mode} if isinstance(expected_mode, list) else expected_mode
+        return await self.__collection.find_one_and_update(
+            {'telegram_id': self.preprocess_id(admin_id), 'mode': mode_filter},
+            {'$set': key_value_pair},
+            projection={"_id": 0, "mode": 1, "dtype": 1},
+            return_document=ReturnDocument.BEFORE,
+        )
+
+    async def try_switch_mode(
+            self, admin_id: int, mode: str, default: str | list[str], **key_value_pair
+    ) -> bool:
+        """
+        Switch to `mode` only from `default`, concurrent callers cannot both succeed.
+        """
+        document = await self.compare_and_set(admin_id, default, mode=mode, **key_value_pair)
+        return document is not None
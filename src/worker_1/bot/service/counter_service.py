@@ -0,0 +1,53 @@
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+
+COUNTER_COLLECTION = "subscriber_counter"
+
+
+class CounterService:
+    """
+    Number of subscribers per status, one document per status, shared with the master bot.
+
+    The counters are moved by whichever service changes the status of a subscriber and are reset from the
+    subscriber collection by `reset`, which corrects any drift.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        # Counters are looked up by _id only
+        return None
+
+    async def get(self, status: str) -> int | None:
+        """
+        Returns:
+            int | None: the counter of `status`, None if it was never set
+        """
+        document = await self.__collection.find_one({"_id": status}, {"count": 1})
+        if document is None:
+            return None
+        return document["count"]
+
+    async def increment(self, changes: dict[str, int]) -> None:
+        """
+        Move the counters atomically by `changes`, a delta per status.
+        """
+        requests = [
+            pymongo.UpdateOne({"_id": status}, {"$inc": {"count": delta}}, upsert=True)
+            for status, delta in changes.items() if delta != 0
+        ]
+        if len(requests) == 0:
+            return None
+        await self.__collection.bulk_write(requests, ordered=False)
+
+    async def reset(self, counts: dict[str, int]) -> None:
+        """
+        Overwrite the counters with `counts`, statuses left out are set to 0.
+        """
+        requests: list = [
+            pymongo.UpdateOne({"_id": status}, {"$set": {"count": count}}, upsert=True)
+            for status, count in counts.items()
+        ]
+        requests.append(pymongo.UpdateMany({"_id": {"$nin": list(counts.keys())}}, {"$set": {"count": 0}}))
+        await self.__collection.bulk_write(requests, ordered=False)
@@ -0,0 +1,63 @@
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+
+DELIVERY_COLLECTION = "delivery"
+
+
+class DeliveryService:
+    """
+    Track which subscribers received which broadcast job.
+
+    One document per (job_hash, telegram_id), the pair is unique. A media job is identified by the md5 of
+    its file name or URL, see `MediaContent.job_hash`.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.__collection.create_index(
+            [("job_hash", pymongo.ASCENDING), ("telegram_id", pymongo.ASCENDING)],
+            name="job_hash_telegram_id", unique=True
+        )
+
+    @staticmethod
+    def mark_request(job_hash: str, telegram_id: int) -> pymongo.UpdateOne:
+        """
+        Build an idempotent write request marking the job as delivered to the subscriber.
+        """
+        return pymongo.UpdateOne(
+            {"job_hash": job_hash, "telegram_id": telegram_id},
+            {"$setOnInsert": {"datetime": str(datetime.now())}},
+            upsert=True
+        )
+
+    async def bulk_write(self, requests: list) -> int:
+        if len(requests) == 0:
+            return 0
+        result = await self.__collection.bulk_write(requests, ordered=False)
+        return result.upserted_count + result.modified_count
+
+    async def is_delivered(self, job_hash: str, telegram_id: int) -> bool:
+        count = await self.__collection.count_documents(
+            {"job_hash": job_hash, "telegram_id": telegram_id}, limit=1
+        )
+        return count > 0
+
+    async def delivered_among(self, job_hash: str, telegram_ids: list[int]) -> set[int]:
+        """
+        Returns:
+            set[int]: the subscribers of `telegram_ids` who already received the job, read from the
+            (job_hash, telegram_id) index only
+        """
+        if len(telegram_ids) == 0:
+            return set()
+        find_cursor = self.__collection.find(
+            {"job_hash": job_hash, "telegram_id": {"$in": telegram_ids}}, {"_id": 0, "telegram_id": 1}
+        )
+        return {document["telegram_id"] async for document in find_cursor}
+
+    async def reset(self, job_hash: str) -> int:
+        delete_result = await self.__collection.delete_many({"job_hash": job_hash})
+        return delete_result.deleted_count
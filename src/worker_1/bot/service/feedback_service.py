@@ -0,0 +1,48 @@
+from datetime import datetime
+from typing import AsyncIterator
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+
+FEEDBACK_COLLECTION = "feedback"
+FEEDBACK_COLUMNS = ["telegram_id", "username", "message", "created_at"]
+
+
+class FeedbackService:
+    """
+    Feedback messages of subscribers, one document per message, written by the master bot.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        # Serves the feedback of a subscriber, newest first, shared with the master bot
+        await self.__collection.create_index(
+            [("telegram_id", pymongo.ASCENDING), ("created_at", pymongo.DESCENDING)], name="telegram_id_created_at"
+        )
+        # Serves exports by date
+        await self.__collection.create_index("created_at", name="created_at")
+
+    async def iter_batches(self, batch_size: int, since: datetime | None = None) -> AsyncIterator[list[dict]]:
+        """
+        Stream feedback messages from a single server-side cursor, oldest first.
+
+        Args:
+            batch_size (int): maximum number of messages per batch
+            since (datetime | None): only messages received at or after this time, None for all of them
+
+        Yields:
+            list[dict]: up to `batch_size` messages, one batch per round trip to the DB
+        """
+        query = {} if since is None else {"created_at": {"$gte": since}}
+        find_cursor = self.__collection.find(
+            query, {"_id": 0}, sort=[("created_at", pymongo.ASCENDING)], batch_size=batch_size
+        )
+        batch: list[dict] = list()
+        async for document in find_cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = list()
+        if len(batch) > 0:
+            yield batch
@@ -0,0 +1,134 @@
+from dataclasses import dataclass, field
+from datetime import datetime
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+
+JOB_STATE_PENDING = "pending"
+JOB_STATE_RUNNING = "running"
+JOB_STATE_DONE = "done"
+JOB_STATE_FAILED = "failed"
+
+
+@dataclass
+class BroadcastJob:
+    bot_id: str
+    admin_id: int
+    dtype: str
+    content: str
+    job_hash: str
+    state: str = JOB_STATE_RUNNING
+    n_partition: int = 1
+    n_job: int = 0
+    n_success: int = 0
+    n_failed: int = 0
+    created_at: str = field(default_factory=lambda: str(datetime.now()))
+    job_id: str | None = None
+    n_audience: int | None = None  # size of the audience snapshot, None when the job pages the subscribers
+
+    def to_dict(self) -> dict:
+        return {
+            "bot_id": self.bot_id,
+            "admin_id": self.admin_id,
+            "dtype": self.dtype,
+            "content": self.content,
+            "job_hash": self.job_hash,
+            "state": self.state,
+            "n_partition": self.n_partition,
+            "n_job": self.n_job,
+            "n_success": self.n_success,
+            "n_failed": self.n_failed,
+            "created_at": self.created_at,
+            "n_audience": self.n_audience,
+            "updated_at": str(datetime.now()),
+        }
+
+    @classmethod
+    def from_dict(cls, document: dict) -> "BroadcastJob":
+        return cls(
+            document["bot_id"], document["admin_id"], document["dtype"], document["content"],
+            document["job_hash"], document["state"], document.get("n_partition", 1),
+            document.get("n_job", 0), document.get("n_success", 0), document.get("n_failed", 0),
+            document.get("created_at", ""), str(document["_id"]), document.get("n_audience")
+        )
+
+
+class JobService:
+    """
+    Persist broadcast jobs so an interrupted broadcast can be resumed.
+
+    Notes:
+    - A job is pending until its audience snapshot is complete, only running jobs are resumed.
+    - The audience of a job is split into partitions, see `PartitionService`, the counters of the job are
+      the sum of its partitions'.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.__collection.create_index(
+            [("bot_id", pymongo.ASCENDING), ("state", pymongo.ASCENDING)], name="bot_id_state"
+        )
+
+    async def create(self, job: BroadcastJob) -> str:
+        insert_result = await self.__collection.insert_one(job.to_dict())
+        job.job_id = str(insert_result.inserted_id)
+        return job.job_id
+
+    async def set_audience(self, job: BroadcastJob) -> None:
+        """
+        Commit the partitioning of a job and the size of its audience snapshot, which completes the snapshot,
+        and move the job from pending to running.
+        """
+        job.state = JOB_STATE_RUNNING
+        await self.__collection.update_one(
+            {"_id": ObjectId(job.job_id)},
+            {"$set": {
+                "state": job.state,
+                "n_partition": job.n_partition,
+                "n_audience": job.n_audience,
+                "updated_at": str(datetime.now()),
+            }}
+        )
+
+    async def checkpoint(self, job: BroadcastJob) -> None:
+        """
+        Commit the counters of a running job.
+        """
+        await self.__collection.update_one(
+            {"_id": ObjectId(job.job_id)},
+            {"$set": {
+                "n_job": job.n_job,
+                "n_success": job.n_success,
+                "n_failed": job.n_failed,
+                "updated_at": str(datetime.now()),
+            }}
+        )
+
+    async def finish(self, job: BroadcastJob, state: str) -> None:
+        job.state = state
+        await self.__collection.update_one(
+            {"_id": ObjectId(job.job_id)},
+            {"$set": {
+                "state": state,
+                "n_job": job.n_job,
+                "n_success": job.n_success,
+                "n_failed": job.n_failed,
+                "updated_at": str(datetime.now()),
+            }}
+        )
+
+    async def get(self, job_id: str) -> BroadcastJob | None:
+        document = await self.__collection.find_one({"_id": ObjectId(job_id)})
+        if document is None:
+            return None
+        return BroadcastJob.from_dict(document)
+
+    async def list_running(self, bot_id: str) -> list[BroadcastJob]:
+        return await self.list_by_state(bot_id, JOB_STATE_RUNNING)
+
+    async def list_by_state(self, bot_id: str, state: str) -> list[BroadcastJob]:
+        find_cursor = self.__collection.find({"bot_id": bot_id, "state": state})
+        documents = await find_cursor.to_list(length=None)
+        return list(map(BroadcastJob.from_dict, documents))
@@ -0,0 +1,34 @@
+from datetime import datetime
+from motor.motor_asyncio import AsyncIOMotorCollection
+
+
+class MediaCacheService:
+    """
+    Map media content to the Telegram file_id returned by its first successful upload.
+
+    Notes:
+    - file_id is only valid for the bot that uploaded the file, the bot id is expected to be part of the key.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.__collection.create_index("content_key", name="content_key", unique=True)
+
+    async def get_file_id(self, content_key: str) -> str | None:
+        document = await self.__collection.find_one({"content_key": content_key}, {"file_id": 1})
+        if document:
+            return document.get("file_id")
+        return None
+
+    async def set_file_id(self, content_key: str, dtype: str, file_id: str) -> None:
+        await self.__collection.update_one(
+            {"content_key": content_key},
+            {"$set": {"dtype": dtype, "file_id": file_id, "datetime": str(datetime.now())}},
+            upsert=True
+        )
+
+    async def invalidate(self, content_key: str) -> int:
+        delete_result = await self.__collection.delete_one({"content_key": content_key})
+        return delete_result.deleted_count
@@ -0,0 +1,723 @@
+"""
+In-process storage backend with the subset of the Motor collection API used by the services.
+
+Selected with `STORAGE_BACKEND: memory`, benchmarks and load tests of the broadcast path then run without a
+mongod and measure the Python overhead of the bot alone. Data lives in the process and is lost on exit.
+
+It is an approximation of MongoDB written for the queries the services issue, not a reimplementation,
+and no test checks it against a mongod: a result obtained with it says nothing about MongoDB. It covers:
+- query operators $eq, $ne, $gt, $gte, $lt, $lte, $in, $nin, $exists, $size, $or, $and, $nor, with BSON
+  type bracketing for comparisons and `{field: None}` matching missing fields
+- update operators $set, $unset, $inc, $setOnInsert, upserts seeded from the equality fields of the filter
+- unique indexes raise DuplicateKeyError, unordered bulk writes report BulkWriteError with the
+  upserts that succeeded
+- aggregation stages $match, $sort, $skip, $limit, $project, $group, $count, $lookup (including the
+  pipeline form), $indexStats and $collStats
+
+Notes:
+- Anything outside the list above, e.g. dotted paths into arrays, $elemMatch, $regex, $push, collations or
+  transactions, is unsupported and raises OperationFailure or behaves differently.
+- Indexes are kept as sorted lists and used for equality prefixes followed by one range, as MongoDB
+  would, so keyset pagination costs the same at any position.
+- Operations complete without yielding to the event loop, each one is atomic.
+- Documents are copied on the way in and out, callers never share state with the store.
+"""
+import bisect
+import itertools
+from datetime import datetime
+from typing import Any, Callable, Iterable, Iterator
+
+from bson import ObjectId
+import pymongo
+from pymongo import ReturnDocument
+from pymongo.errors import BulkWriteError, DuplicateKeyError, OperationFailure, WriteError
+from pymongo.results import BulkWriteResult, DeleteResult, InsertManyResult, InsertOneResult, UpdateResult
+
+_MISSING = object()
+# Sentinels bounding every key component, see `_rank_key`
+_MIN: tuple = (0,)
+_MAX: tuple = (99,)
+
+
+def _rank_key(value: Any) -> tuple:
+    """
+    Totally ordered key of a value, following the BSON comparison order between types.
+    """
+    if value is _MISSING or value is None:
+        return (1,)
+    if isinstance(value, bool):
+        return (8, value)
+    if isinstance(value, (int, float)):
+        return (2, value)
+    if isinstance(value, str):
+        return (3, value)
+    if isinstance(value, dict):
+        return (4, repr(value))
+    if isinstance(value, (list, tuple)):
+        return (5, repr(value))
+    if isinstance(value, bytes):
+        return (6, value)
+    if isinstance(value, ObjectId):
+        # Bytes compare in C, ObjectId comparisons dominate index maintenance otherwise
+        return (7, value.binary)
+    if isinstance(value, datetime):
+        return (9, value)
+    return (10, repr(value))
+
+
+def _copy(value: Any) -> Any:
+    if isinstance(value, dict):
+        return {key: _copy(item) for key, item in value.items()}
+    if isinstance(value, list):
+        return [_copy(item) for item in value]
+    return value
+
+
+def _get(document: dict, path: str) -> Any:
+    if "." not in path:
+        return document.get(path, _MISSING)
+    current: Any = document
+    for part in path.split("."):
+        if not isinstance(current, dict) or part not in current:
+            return _MISSING
+        current = current[part]
+    return current
+
+
+def _set(document: dict, path: str, value: Any) -> None:
+    *parents, leaf = path.split(".")
+    for part in parents:
+        document = document.setdefault(part, dict())
+    document[leaf] = value
+
+
+def _unset(document: dict, path: str) -> None:
+    *parents, leaf = path.split(".")
+    for part in parents:
+        document = document.get(part)
+        if not isinstance(document, dict):
+            return None
+    document.pop(leaf, None)
+
+
+def _is_operator(condition: Any) -> bool:
+    return isinstance(condition, dict) and len(condition) > 0 and all(key.startswith("$") for key in condition)
+
+
+def _equals(value: Any, target: Any) -> bool:
+    if target is None:
+        return value is _MISSING or value is None
+    if value is _MISSING:
+        return False
+    if isinstance(value, list) and not isinstance(target, list):
+        return any(_equals(item, target) for item in value)
+    if isinstance(value, bool) or isinstance(target, bool):
+        return _rank_key(value) == _rank_key(target)
+    return value == target
+
+
+def _compare(value: Any, target: Any) -> int | None:
+    """
+    Returns:
+        int | None: -1, 0 or 1, None when the values are of different BSON types and never compare
+    """
+    if value is _MISSING:
+        return None
+    left, right = _rank_key(value), _rank_key(target)
+    if left[0] != right[0]:
+        return None
+    return (left > right) - (left < right)
+
+
+def _apply_operator(operator: str, value: Any, argument: Any) -> bool:
+    if operator == "$eq":
+        return _equals(value, argument)
+    if operator == "$ne":
+        return not _equals(value, argument)
+    if operator in ("$gt", "$gte", "$lt", "$lte"):
+        result = _compare(value, argument)
+        if result is None:
+            return False
+        return {"$gt": result > 0, "$gte": result >= 0, "$lt": result < 0, "$lte": result <= 0}[operator]
+    if operator == "$in":
+        return any(_equals(value, item) for item in argument)
+    if operator == "$nin":
+        return not any(_equals(value, item) for item in argument)
+    if operator == "$exists":
+        return (value is not _MISSING) == bool(argument)
+    if operator == "$size":
+        return isinstance(value, list) and len(value) == argument
+    raise OperationFailure(f"unknown operator: {operator}", 2)
+
+
+def _match(document: dict, query: dict) -> bool:
+    for key, condition in query.items():
+        if key == "$or":
+            if not any(_match(document, sub_query) for sub_query in condition):
+                return False
+        elif key == "$and":
+            if not all(_match(document, sub_query) for sub_query in condition):
+                return False
+        elif key == "$nor":
+            if any(_match(document, sub_query) for sub_query in condition):
+                return False
+        elif key.startswith("$"):
+            raise OperationFailure(f"unknown top level operator: {key}", 2)
+        else:
+            value = _get(document, key)
+            if _is_operator(condition):
+                if not all(_apply_operator(op, value, argument) for op, argument in condition.items()):
+                    return False
+            elif not _equals(value, condition):
+                return False
+    return True
+
+
+def _project(document: dict, projection: dict | None) -> dict:
+    if projection is None:
+        return _copy(document)
+    include_id = bool(projection.get("_id", 1))
+    included = [key for key, flag in projection.items() if key != "_id" and flag]
+    if len(included) > 0:
+        result = {"_id": document["_id"]} if include_id and "_id" in document else dict()
+        for key in included:
+            value = _get(document, key)
+            if value is not _MISSING:
+                _set(result, key, _copy(value))
+        return result
+    result = _copy(document)
+    for key, flag in projection.items():
+        if not flag:
+            _unset(result, key)
+    return result
+
+
+def _normalize_sort(sort: Any) -> list[tuple[str, int]] | None:
+    if sort is None:
+        return None
+    if isinstance(sort, str):
+        return [(sort, pymongo.ASCENDING)]
+    if isinstance(sort, dict):
+        return list(sort.items())
+    return [(key, direction) for key, direction in sort]
+
+
+def _sorted(documents: Iterable[dict], sort: list[tuple[str, int]]) -> list[dict]:
+    result = list(documents)
+    # Stable sorts from the last key to the first
+    for key, direction in reversed(sort):
+        result.sort(key=lambda document: _rank_key(_get(document, key)), reverse=direction < 0)
+    return result
+
+
+def _equality_seed(query: dict) -> dict:
+    """
+    Fields an upsert inherits from its filter.
+    """
+    seed: dict = dict()
+    for key, condition in query.items():
+        if key == "$and":
+            for sub_query in condition:
+                for sub_key, value in _equality_seed(sub_query).items():
+                    _set(seed, sub_key, value)
+        elif key.startswith("$"):
+            continue
+        elif _is_operator(condition):
+            if "$eq" in condition:
+                _set(seed, key, _copy(condition["$eq"]))
+        else:
+            _set(seed, key, _copy(condition))
+    return seed
+
+
+def _apply_update(document: dict, update: dict, is_insert: bool) -> dict:
+    if len(update) == 0 or not all(key.startswith("$") for key in update):
+        raise ValueError("update only works with $ operators")
+    result = _copy(document)
+    for operator, fields in update.items():
+        if operator == "$set" or (operator == "$setOnInsert" and is_insert):
+            for path, value in fields.items():
+                _set(result, path, _copy(value))
+        elif operator == "$setOnInsert":
+            continue
+        elif operator == "$unset":
+            for path in fields:
+                _unset(result, path)
+        elif operator == "$inc":
+            for path, value in fields.items():
+                current = _get(result, path)
+                if current is _MISSING:
+                    current = 0
+                if isinstance(current, bool) or not isinstance(current, (int, float)):
+                    raise WriteError(f"Cannot apply $inc to a value of non-numeric type at {path}", 14)
+                _set(result, path, current + value)
+        else:
+            raise WriteError(f"Unknown modifier: {operator}", 9)
+    if "_id" in document and _rank_key(result.get("_id")) != _rank_key(document["_id"]):
+        raise WriteError("Performing an update on the path '_id' would modify the immutable field '_id'", 66)
+    return result
+
+
+class _Index:
+    """
+    Sorted (key components..., document key) entries of one index.
+    """
+
+    def __init__(self, name: str, keys: list[tuple[str, int]], unique: bool):
+        self.name = name
+        self.keys = keys
+        self.unique = unique
+        self.entries: list[tuple] = list()
+        self.ops = 0
+        self.since = datetime.now()
+
+    def key_of(self, document: dict) -> tuple:
+        return tuple(_rank_key(_get(document, field)) for field, _ in self.keys)
+
+    def conflict(self, document: dict, document_key: tuple) -> bool:
+        if not self.unique:
+            return False
+        key = self.key_of(document)
+        position = bisect.bisect_left(self.entries, key)
+        for entry in self.entries[position:position + 2]:
+            if entry[:-1] == key and entry[-1] != document_key:
+                return True
+        return False
+
+    def add(self, document: dict, document_key: tuple) -> None:
+        bisect.insort(self.entries, self.key_of(document) + (document_key,))
+
+    def remove(self, document: dict, document_key: tuple) -> None:
+        entry = self.key_of(document) + (document_key,)
+        position = bisect.bisect_left(self.entries, entry)
+        if position < len(self.entries) and self.entries[position] == entry:
+            del self.entries[position]
+
+
+class MemoryCursor:
+    """
+    Result of `find` and `aggregate`, the operation runs when the first result is requested.
+    """
+
+    def __init__(self, fetch: Callable[[], list[dict]]):
+        self.__fetch = fetch
+        self.__documents: Iterator[dict] | None = None
+
+    def __load(self) -> Iterator[dict]:
+        if self.__documents is None:
+            self.__documents = iter(self.__fetch())
+        return self.__documents
+
+    async def to_list(self, length: int | None = None) -> list[dict]:
+        return list(itertools.islice(self.__load(), length))
+
+    def __aiter__(self) -> "MemoryCursor":
+        return self
+
+    async def __anext__(self) -> dict:
+        try:
+            return next(self.__load())
+        except StopIteration:
+            raise StopAsyncIteration
+
+
+class MemoryCollection:
+    def __init__(self, database: "MemoryDatabase", name: str):
+        self.__database = database
+        self.__name = name
+        # Keyed by the rank key of _id, which is the last component of every index entry
+        self.__documents: dict[tuple, dict] = dict()
+        self.__indexes: dict[str, _Index] = {"_id_": _Index("_id_", [("_id", pymongo.ASCENDING)], True)}
+        self.__collection_scans = 0
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    @property
+    def database(self) -> "MemoryDatabase":
+        return self.__database
+
+    # Storage
+
+    def __store(self, old: dict | None, new: dict) -> None:
+        document_key = _rank_key(new["_id"])
+        for index in self.__indexes.values():
+            if index.conflict(new, document_key):
+                raise DuplicateKeyError(
+                    f"E11000 duplicate key error collection: {self.__name} index: {index.name}", 11000
+                )
+        for index in self.__indexes.values():
+            if old is not None:
+                index.remove(old, document_key)
+            index.add(new, document_key)
+        self.__documents[document_key] = new
+
+    def __delete(self, document: dict) -> None:
+        document_key = _rank_key(document["_id"])
+        for index in self.__indexes.values():
+            index.remove(document, document_key)
+        del self.__documents[document_key]
+
+    def __insert(self, document: dict) -> Any:
+        document = _copy(document)
+        if "_id" not in document:
+            document["_id"] = ObjectId()
+        self.__store(None, document)
+        return document["_id"]
+
+    # Query planning
+
+    def __plan(self, query: dict) -> tuple[_Index, tuple, tuple, int] | None:
+        """
+        Pick the index matching the longest equality prefix of `query`, then one range on the next key.
+
+        Returns:
+            tuple[_Index, tuple, tuple, int] | None: index, lower and upper probes of its entries and number
+            of equality keys, None when no index applies
+        """
+        best: tuple[tuple[int, int], _Index, tuple, tuple, int] | None = None
+        for index in self.__indexes.values():
+            prefix: list[tuple] = list()
+            lower, upper = _MIN, _MAX
+            has_range = 0
+            for field, _ in index.keys:
+                condition = query.get(field, _MISSING)
+                if condition is _MISSING:
+                    break
+                if not _is_operator(condition) and not isinstance(condition, (dict, list)):
+                    prefix.append(_rank_key(condition))
+                    continue
+                if _is_operator(condition) and set(condition) == {"$eq"} \
+                        and not isinstance(condition["$eq"], (dict, list)):
+                    prefix.append(_rank_key(condition["$eq"]))
+                    continue
+                if _is_operator(condition) and set(condition) <= {"$gt", "$gte", "$lt", "$lte"}:
+                    has_range = 1
+                    for operator, argument in condition.items():
+                        key = _rank_key(argument)
+                        if operator == "$gt":
+                            lower = (key, _MAX)
+                        elif operator == "$gte":
+                            lower = (key,)
+                        elif operator == "$lt":
+                            upper = (key,)
+                        else:
+                            upper = (key, _MAX)
+                    rank = _rank_key(next(iter(condition.values())))[0]
+                    if lower is _MIN:
+                        lower = ((rank,),)
+                    if upper is _MAX:
+                        upper = ((rank + 1,),)
+                break
+            score = (len(prefix), has_range)
+            if score == (0, 0):
+                continue
+            if lower is _MIN:
+                lower, upper = (_MIN,), (_MAX,)
+            if best is None or score > best[0]:
+                best = (score, index, tuple(prefix) + lower, tuple(prefix) + upper, len(prefix))
+        if best is None:
+            return None
+        return best[1:]
+
+    def __select(self, query: dict | None, sort: Any = None) -> Iterator[dict]:
+        """
+        Stored documents matching `query` in `sort` order, lazily when an index provides the order.
+        """
+        query = query or dict()
+        sort = _normalize_sort(sort)
+        plan = self.__plan(query)
+        if plan is None:
+            self.__collection_scans += 1
+            candidates: Iterable[dict] = list(self.__documents.values())
+            ordered = False
+        else:
+            index, lower, upper, n_equal = plan
+            index.ops += 1
+            start = bisect.bisect_left(index.entries, lower)
+            stop = bisect.bisect_left(index.entries, upper)
+            entries = index.entries[start:stop]
+            sort_fields = [field for field, _ in sort] if sort else []
+            index_fields = [field for field, _ in index.keys][n_equal:n_equal + len(sort_fields)]
+            directions = {direction for _, direction in sort} if sort else {pymongo.ASCENDING}
+            ordered = sort_fields == index_fields and len(directions) == 1
+            if ordered and directions == {pymongo.DESCENDING}:
+                entries.reverse()
+            candidates = (self.__documents[entry[-1]] for entry in entries)
+        matches = (document for document in candidates if _match(document, query))
+        if sort and not ordered:
+            return iter(_sorted(matches, sort))
+        return matches
+
+    # Collection API
+
+    async def create_index(self, keys: Any, name: str | None = None, unique: bool = False, **kwargs) -> str:
+        keys = _normalize_sort(keys)
+        name = name or "_".join(f"{field}_{direction}" for field, direction in keys)
+        existing = self.__indexes.get(name)
+        if existing is not None:
+            if existing.keys != keys or existing.unique != unique:
+                raise OperationFailure(f"An existing index has the same name as the requested index: {name}", 86)
+            return name
+        index = _Index(name, keys, unique)
+        for document_key, document in self.__documents.items():
+            if index.conflict(document, document_key):
+                raise DuplicateKeyError(f"E11000 duplicate key error collection: {self.__name} index: {name}", 11000)
+            index.add(document, document_key)
+        self.__indexes[name] = index
+        return name
+
+    async def insert_one(self, document: dict, **kwargs) -> InsertOneResult:
+        return InsertOneResult(self.__insert(document), True)
+
+    async def insert_many(self, documents: Iterable[dict], ordered: bool = True, **kwargs) -> InsertManyResult:
+        inserted_ids, write_errors = list(), list()
+        for position, document in enumerate(documents):
+            try:
+                inserted_ids.append(self.__insert(document))
+            except WriteError as err:
+                write_errors.append({"index": position, "code": err.code, "errmsg": str(err)})
+                if ordered:
+                    break
+        if len(write_errors) > 0:
+            raise BulkWriteError({
+                "nInserted": len(inserted_ids), "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+                "upserted": [], "writeErrors": write_errors, "writeConcernErrors": [],
+            })
+        return InsertManyResult(inserted_ids, True)
+
+    def find(
+            self, filter: dict | None = None, projection: dict | None = None, skip: int = 0, limit: int = 0,
+            sort: Any = None, **kwargs
+    ) -> MemoryCursor:
+        def fetch() -> list[dict]:
+            documents = itertools.islice(self.__select(filter, sort), skip, skip + limit if limit else None)
+            return [_project(document, projection) for document in documents]
+        return MemoryCursor(fetch)
+
+    async def find_one(self, filter: dict | None = None, projection: dict | None = None, **kwargs) -> dict | None:
+        documents = await self.find(filter, projection, limit=1, **kwargs).to_list(length=None)
+        return documents[0] if len(documents) > 0 else None
+
+    async def count_documents(self, filter: dict, skip: int = 0, limit: int = 0, **kwargs) -> int:
+        documents = itertools.islice(self.__select(filter), skip, skip + limit if limit else None)
+        return sum(1 for _ in documents)
+
+    async def estimated_document_count(self, **kwargs) -> int:
+        return len(self.__documents)
+
+    def __update(self, query: dict, update: dict, upsert: bool, multi: bool) -> dict:
+        """
+        Returns:
+            dict: raw result, n matched, nModified and the upserted _id if any
+        """
+        n_matched, n_modified = 0, 0
+        matches = self.__select(query)
+        # Collected before writing, writes move the index entries being iterated
+        for document in list(matches if multi else itertools.islice(matches, 1)):
+            updated = _apply_update(document, update, False)
+            n_matched += 1
+            if updated != document:
+                self.__store(document, updated)
+                n_modified += 1
+        if n_matched == 0 and upsert:
+            inserted_id = self.__insert(_apply_update(_equality_seed(query), update, True))
+            return {"n": 1, "nModified": 0, "upserted": inserted_id, "updatedExisting": False}
+        return {"n": n_matched, "nModified": n_modified, "updatedExisting": n_matched > 0}
+
+    async def update_one(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self.__update(filter, update, upsert, False), True)
+
+    async def update_many(self, filter: dict, update: dict, upsert: bool = False, **kwargs) -> UpdateResult:
+        return UpdateResult(self.__update(filter, update, upsert, True), True)
+
+    async def find_one_and_update(
+            self, filter: dict, update: dict, projection: dict | None = None, sort: Any = None,
+            upsert: bool = False, return_document: bool = ReturnDocument.BEFORE, **kwargs
+    ) -> dict | None:
+        document = next(self.__select(filter, sort), None)
+        if document is None:
+            if not upsert:
+                return None
+            inserted_id = self.__insert(_apply_update(_equality_seed(filter), update, True))
+            if return_document == ReturnDocument.BEFORE:
+                return None
+            return _project(self.__documents[_rank_key(inserted_id)], projection)
+        updated = _apply_update(document, update, False)
+        self.__store(document, updated)
+        return _project(updated if return_document == ReturnDocument.AFTER else document, projection)
+
+    async def delete_one(self, filter: dict, **kwargs) -> DeleteResult:
+        document = next(self.__select(filter), None)
+        if document is None:
+            return DeleteResult({"n": 0}, True)
+        self.__delete(document)
+        return DeleteResult({"n": 1}, True)
+
+    async def delete_many(self, filter: dict, **kwargs) -> DeleteResult:
+        documents = list(self.__select(filter))
+        for document in documents:
+            self.__delete(document)
+        return DeleteResult({"n": len(documents)}, True)
+
+    async def bulk_write(self, requests: list, ordered: bool = True, **kwargs) -> BulkWriteResult:
+        result: dict = {
+            "nInserted": 0, "nUpserted": 0, "nMatched": 0, "nModified": 0, "nRemoved": 0,
+            "upserted": [], "writeErrors": [], "writeConcernErrors": [],
+        }
+        for position, request in enumerate(requests):
+            try:
+                if isinstance(request, pymongo.InsertOne):
+                    self.__insert(request._doc)
+                    result["nInserted"] += 1
+                elif isinstance(request, (pymongo.UpdateOne, pymongo.UpdateMany)):
+                    raw = self.__update(
+                        request._filter, request._doc, request._upsert, isinstance(request, pymongo.UpdateMany)
+                    )
+                    if "upserted" in raw:
+                        result["nUpserted"] += 1
+                        result["upserted"].append({"index": position, "_id": raw["upserted"]})
+                    else:
+                        result["nMatched"] += raw["n"]
+                        result["nModified"] += raw["nModified"]
+                elif isinstance(request, (pymongo.DeleteOne, pymongo.DeleteMany)):
+                    delete_result = await (
+                        self.delete_many(request._filter) if isinstance(request, pymongo.DeleteMany)
+                        else self.delete_one(request._filter)
+                    )
+                    result["nRemoved"] += delete_result.deleted_count
+                else:
+                    raise TypeError(f"{type(request).__name__} is not supported by the memory backend")
+            except WriteError as err:
+                result["writeErrors"].append({"index": position, "code": err.code, "errmsg": str(err)})
+                if ordered:
+                    break
+        if len(result["writeErrors"]) > 0:
+            raise BulkWriteError(result)
+        return BulkWriteResult(result, True)
+
+    # Aggregation
+
+    def aggregate(self, pipeline: list[dict], **kwargs) -> MemoryCursor:
+        return MemoryCursor(lambda: list(self.__aggregate(pipeline)))
+
+    def __aggregate(self, pipeline: list[dict]) -> Iterator[dict]:
+        stages = list(pipeline)
+        if len(stages) > 0 and "$indexStats" in stages[0]:
+            return iter([
+                {"name": index.name, "key": dict(index.keys), "accesses": {"ops": index.ops, "since": index.since}}
+                for index in self.__indexes.values()
+            ])
+        if len(stages) > 0 and "$collStats" in stages[0]:
+            return iter([{
+                "ns": f"{self.__database.name}.{self.__name}",
+                "queryExecStats": {"collectionScans": {"total": self.__collection_scans}},
+            }])
+        # A leading $match and $sort run as a query, so they can use an index
+        query, sort = dict(), None
+        if len(stages) > 0 and "$match" in stages[0]:
+            query = stages.pop(0)["$match"]
+        if len(stages) > 0 and "$sort" in stages[0]:
+            sort = stages.pop(0)["$sort"]
+        documents: Iterator[dict] = (_copy(document) for document in self.__select(query, sort))
+        for stage in stages:
+            documents = self.__stage(documents, stage)
+        return documents
+
+    def __stage(self, documents: Iterator[dict], stage: dict) -> Iterator[dict]:
+        (name, spec), = stage.items()
+        if name == "$match":
+            return (document for document in documents if _match(document, spec))
+        if name == "$sort":
+            return iter(_sorted(documents, _normalize_sort(spec)))
+        if name == "$skip":
+            return itertools.islice(documents, spec, None)
+        if name == "$limit":
+            return itertools.islice(documents, spec)
+        if name == "$project":
+            return (_project(document, spec) for document in documents)
+        if name == "$lookup":
+            return (self.__lookup(document, spec) for document in documents)
+        if name == "$group":
+            return iter(self.__group(documents, spec))
+        if name == "$count":
+            return iter([{spec: sum(1 for _ in documents)}])
+        raise OperationFailure(f"Unrecognized pipeline stage name: '{name}'", 40324)
+
+    def __lookup(self, document: dict, spec: dict) -> dict:
+        if "let" in spec or "localField" not in spec:
+            raise OperationFailure("$lookup is only supported with localField and foreignField", 2)
+        foreign: MemoryCollection = self.__database[spec["from"]]
+        local_value = _get(document, spec["localField"])
+        join: dict = {spec["foreignField"]: None if local_value is _MISSING else local_value}
+        pipeline = list(spec.get("pipeline", []))
+        # Merged into the join, an index on both fields serves the lookup
+        if len(pipeline) > 0 and "$match" in pipeline[0] and spec["foreignField"] not in pipeline[0]["$match"]:
+            join.update(pipeline.pop(0)["$match"])
+        document[spec["as"]] = list(foreign.__aggregate([{"$match": join}] + pipeline))
+        return document
+
+    @staticmethod
+    def __group(documents: Iterable[dict], spec: dict) -> list[dict]:
+        def evaluate(expression: Any, document: dict) -> Any:
+            if isinstance(expression, str) and expression.startswith("$"):
+                value = _get(document, expression[1:])
+                return None if value is _MISSING else value
+            return expression
+
+        groups: dict[tuple, dict] = dict()
+        for document in documents:
+            group_id = evaluate(spec["_id"], document)
+            group = groups.setdefault(_rank_key(group_id), {"_id": group_id})
+            for field, accumulator in spec.items():
+                if field == "_id":
+                    continue
+                (operator, expression), = accumulator.items()
+                value = evaluate(expression, document)
+                if operator == "$sum":
+                    group[field] = group.get(field, 0) + (value if isinstance(value, (int, float)) else 0)
+                elif operator in ("$min", "$max"):
+                    if value is not None and (field not in group or (
+                            (_rank_key(value) < _rank_key(group[field])) == (operator == "$min"))):
+                        group[field] = value
+                elif operator == "$first":
+                    group.setdefault(field, value)
+                elif operator == "$last":
+                    group[field] = value
+                else:
+                    raise OperationFailure(f"Unsupported accumulator: {operator}", 15952)
+        return list(groups.values())
+
+
+class MemoryDatabase:
+    def __init__(self, name: str):
+        self.__name = name
+        self.__collections: dict[str, MemoryCollection] = dict()
+
+    @property
+    def name(self) -> str:
+        return self.__name
+
+    def __getitem__(self, collection_name: str) -> MemoryCollection:
+        collection = self.__collections.get(collection_name)
+        if collection is None:
+            collection = MemoryCollection(self, collection_name)
+            self.__collections[collection_name] = collection
+        return collection
+
+
+class MemoryClient:
+    """
+    Stands in for `AsyncIOMotorClient`, databases are created on first access.
+    """
+
+    def __init__(self):
+        self.__databases: dict[str, MemoryDatabase] = dict()
+
+    def __getitem__(self, database_name: str) -> MemoryDatabase:
+        database = self.__databases.get(database_name)
+        if database is None:
+            database = MemoryDatabase(database_name)
+            self.__databases[database_name] = database
+        return database
@@ -0,0 +1,176 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta, timezone
+from bson import ObjectId
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+from pymongo import ReturnDocument
+
+from .job_service import JOB_STATE_RUNNING, JOB_STATE_DONE, JOB_STATE_FAILED
+
+
+@dataclass
+class JobPartition:
+    job_id: str
+    index: int
+    lower_id: int | None  # exclusive, None for the first partition
+    upper_id: int | None  # inclusive, None for the last partition
+    state: str = JOB_STATE_RUNNING
+    cursor: int | None = None  # telegram_id of the last subscriber committed
+    owner: str | None = None
+    n_job: int = 0
+    n_success: int = 0
+    n_failed: int = 0
+    partition_id: str | None = None
+    pinned_to: str | None = None  # only this worker may claim the partition, None for any worker
+
+    def to_dict(self) -> dict:
+        return {
+            "job_id": self.job_id,
+            "index": self.index,
+            "lower_id": self.lower_id,
+            "upper_id": self.upper_id,
+            "state": self.state,
+            "cursor": self.cursor,
+            "owner": self.owner,
+            "lease_until": None,
+            "n_job": self.n_job,
+            "n_success": self.n_success,
+            "n_failed": self.n_failed,
+            "pinned_to": self.pinned_to,
+        }
+
+    @classmethod
+    def from_dict(cls, document: dict) -> "JobPartition":
+        return cls(
+            document["job_id"], document["index"], document.get("lower_id"), document.get("upper_id"),
+            document["state"], document.get("cursor"), document.get("owner"),
+            document.get("n_job", 0), document.get("n_success", 0), document.get("n_failed", 0),
+            str(document["_id"]), document.get("pinned_to")
+        )
+
+    @property
+    def after_id(self) -> int | None:
+        return self.cursor if self.cursor is not None else self.lower_id
+
+
+class PartitionService:
+    """
+    Split broadcast jobs into telegram_id ranges that any worker can claim.
+
+    A worker owns a partition while its lease is valid and extends the lease at every checkpoint. The
+    partition of a worker that stopped renewing is claimed by another worker once the lease expired and is
+    resumed from its cursor.
+
+    Notes:
+    - Writes of a worker are conditioned on still owning the partition, a worker whose lease was taken over
+      learns it from the return value and must stop.
+    - Leases are UTC, workers may run in different timezones but their clocks must agree.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection):
+        self.__collection = collection
+
+    async def ensure_indexes(self) -> None:
+        await self.__collection.create_index(
+            [("state", pymongo.ASCENDING), ("lease_until", pymongo.ASCENDING)], name="state_lease_until"
+        )
+        await self.__collection.create_index(
+            [("job_id", pymongo.ASCENDING), ("index", pymongo.ASCENDING)], name="job_id_index", unique=True
+        )
+
+    async def create(self, job_id: str, bounds: list[int], pinned_to: str | None = None) -> list[JobPartition]:
+        """
+        Create one partition per range, `bounds` are the inclusive upper bounds of every range but the last.
+
+        Args:
+            job_id (str): the job
+            bounds (list[int]): inclusive upper bounds of every range but the last
+            pinned_to (str | None): only let this worker claim the partitions, e.g. for a file only its disk has
+        """
+        lower_bounds = [None] + bounds
+        upper_bounds = bounds + [None]
+        partitions = [
+            JobPartition(job_id, index, lower_id, upper_id, pinned_to=pinned_to)
+            for index, (lower_id, upper_id) in enumerate(zip(lower_bounds, upper_bounds))
+        ]
+        insert_result = await self.__collection.insert_many([partition.to_dict() for partition in partitions])
+        for partition, inserted_id in zip(partitions, insert_result.inserted_ids):
+            partition.partition_id = str(inserted_id)
+        return partitions
+
+    async def claim(self, owner: str, lease_seconds: float) -> JobPartition | None:
+        """
+        Claim a running partition that is free, whose lease expired or that `owner` held before a restart.
+
+        Notes:
+        - Partitions pinned to another worker are left alone.
+        """
+        now = datetime.now(timezone.utc)
+        document = await self.__collection.find_one_and_update(
+            {
+                "state": JOB_STATE_RUNNING,
+                "pinned_to": {"$in": [None, owner]},
+                "$or": [{"lease_until": None}, {"lease_until": {"$lt": now}}, {"owner": owner}],
+            },
+            {"$set": {"owner": owner, "lease_until": now + timedelta(seconds=lease_seconds)}},
+            sort=[("job_id", pymongo.ASCENDING), ("index", pymongo.ASCENDING)],
+            return_document=ReturnDocument.AFTER,
+        )
+        if document is None:
+            return None
+        return JobPartition.from_dict(document)
+
+    async def renew(self, partition: JobPartition, lease_seconds: float) -> bool:
+        update_result = await self.__collection.update_one(
+            {"_id": ObjectId(partition.partition_id), "owner": partition.owner, "state": JOB_STATE_RUNNING},
+            {"$set": {"lease_until": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds)}}
+        )
+        return update_result.matched_count > 0
+
+    async def checkpoint(self, partition: JobPartition, lease_seconds: float) -> bool:
+        """
+        Commit the cursor and counters of an owned partition and extend its lease.
+        """
+        update_result = await self.__collection.update_one(
+            {"_id": ObjectId(partition.partition_id), "owner": partition.owner, "state": JOB_STATE_RUNNING},
+            {"$set": {
+                "cursor": partition.cursor,
+                "n_job": partition.n_job,
+                "n_success": partition.n_success,
+                "n_failed": partition.n_failed,
+                "lease_until": datetime.now(timezone.utc) + timedelta(seconds=lease_seconds),
+            }}
+        )
+        return update_result.matched_count > 0
+
+    async def finish(self, partition: JobPartition, state: str) -> bool:
+        partition.state = state
+        update_result = await self.__collection.update_one(
+            {"_id": ObjectId(partition.partition_id), "owner": partition.owner, "state": JOB_STATE_RUNNING},
+            {"$set": {
+                "state": state,
+                "n_job": partition.n_job,
+                "n_success": partition.n_success,
+                "n_failed": partition.n_failed,
+                "lease_until": None,
+            }}
+        )
+        return update_result.matched_count > 0
+
+    async def summarize(self, job_id: str) -> dict:
+        """
+        Sum the counters of a job's partitions and count them by state.
+
+        Returns:
+            dict: n_job, n_success, n_failed and the number of partitions per state
+        """
+        summary = {"n_job": 0, "n_success": 0, "n_failed": 0,
+                   JOB_STATE_RUNNING: 0, JOB_STATE_DONE: 0, JOB_STATE_FAILED: 0}
+        find_cursor = self.__collection.find(
+            {"job_id": job_id}, {"_id": 0, "state": 1, "n_job": 1, "n_success": 1, "n_failed": 1}
+        )
+        async for document in find_cursor:
+            summary[document["state"]] += 1
+            for key in ("n_job", "n_success", "n_failed"):
+                summary[key] += document.get(key, 0)
+        return summary
@@ -0,0 +1,152 @@
+import sys
+from array import array
+from bisect import bisect_right
+from typing import AsyncIterator
+from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+
+SNAPSHOT_COLLECTION = "job_snapshot"
+
+
+def _pack(telegram_ids: array) -> bytes:
+    # Little-endian int64, whatever the platform
+    if sys.byteorder == "big":
+        telegram_ids = array("q", telegram_ids)
+        telegram_ids.byteswap()
+    return telegram_ids.tobytes()
+
+
+def _unpack(data: bytes) -> array:
+    telegram_ids = array("q")
+    telegram_ids.frombytes(data)
+    if sys.byteorder == "big":
+        telegram_ids.byteswap()
+    return telegram_ids
+
+
+def split_points(telegram_ids: array, n_partition: int) -> list[int]:
+    """
+    Split ascending `telegram_ids` into `n_partition` ranges of similar size.
+
+    Returns:
+        list[int]: ascending, inclusive upper bounds of every range but the last, which is open-ended.
+        Fewer bounds are returned when there are fewer subscribers than ranges.
+    """
+    bounds: list[int] = list()
+    for k in range(1, n_partition):
+        position = k * len(telegram_ids) // n_partition
+        if position == 0:
+            continue
+        telegram_id = telegram_ids[position - 1]
+        if len(bounds) == 0 or telegram_id > bounds[-1]:
+            bounds.append(telegram_id)
+    return bounds
+
+
+class SnapshotService:
+    """
+    Freeze the audience of a broadcast job when it starts.
+
+    The telegram_ids are stored in ascending order as packed little-endian int64 arrays, split into documents
+    of at most `chunk_size` subscribers, {job_id, first_id, last_id, count, telegram_ids[, usernames]}.
+    Sending a job reads its snapshot only, subscribers who join or change status afterwards do not move the
+    audience.
+
+    Notes:
+    - Usernames are only kept when asked for, i.e. for texts which are personalized with them.
+    - A snapshot is only complete once the job records its size, see `BroadcastJob.n_audience`.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, chunk_size: int = 50000):
+        assert chunk_size > 0, "chunk_size must be positive"
+        self.__collection = collection
+        self.__chunk_size = chunk_size
+
+    async def ensure_indexes(self) -> None:
+        # Serves resuming a partition from its cursor
+        await self.__collection.create_index(
+            [("job_id", pymongo.ASCENDING), ("last_id", pymongo.ASCENDING)], name="job_id_last_id", unique=True
+        )
+
+    async def __write_chunk(self, job_id: str, telegram_ids: array, usernames: list[str] | None) -> None:
+        document = {
+            "job_id": job_id,
+            "first_id": telegram_ids[0],
+            "last_id": telegram_ids[-1],
+            "count": len(telegram_ids),
+            "telegram_ids": _pack(telegram_ids),
+        }
+        if usernames is not None:
+            document["usernames"] = usernames
+        await self.__collection.insert_one(document)
+
+    async def create(self, job_id: str, pages: AsyncIterator[list[dict]], with_usernames: bool) -> array:
+        """
+        Write the snapshot of a job from pages of subscribers in ascending telegram_id.
+
+        Returns:
+            array: the telegram_ids of the snapshot, ascending, 8 bytes per subscriber
+        """
+        telegram_ids = array("q")
+        chunk = array("q")
+        usernames: list[str] | None = list() if with_usernames else None
+        async for page in pages:
+            for subscriber in page:
+                chunk.append(subscriber["telegram_id"])
+                if usernames is not None:
+                    usernames.append(str(subscriber.get("username")))
+                if len(chunk) == self.__chunk_size:
+                    await self.__write_chunk(job_id, chunk, usernames)
+                    telegram_ids.extend(chunk)
+                    chunk = array("q")
+                    usernames = list() if with_usernames else None
+        if len(chunk) > 0:
+            await self.__write_chunk(job_id, chunk, usernames)
+            telegram_ids.extend(chunk)
+        return telegram_ids
+
+    async def iter_pages(
+            self, job_id: str, page_size: int, after_id: int | None = None, until_id: int | None = None
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Iterate the snapshot of a job page by page in ascending telegram_id, like
+        `SubscriberService.iter_pages`.
+
+        Args:
+            job_id (str): the job
+            page_size (int): maximum number of subscribers per page
+            after_id (int | None): resume after this telegram_id
+            until_id (int | None): stop at this telegram_id, inclusive
+
+        Yields:
+            list[dict]: a non-empty page of subscribers, with telegram_id and username ("" when the snapshot
+            has no usernames)
+
+        Notes:
+        - Pages do not span chunks, the last page of a chunk may be short.
+        """
+        query: dict = {"job_id": job_id}
+        if after_id is not None:
+            query["last_id"] = {"$gt": after_id}
+        if until_id is not None:
+            query["first_id"] = {"$lte": until_id}
+        # Chunks are large, fetch them one at a time
+        find_cursor = self.__collection.find(
+            query, {"_id": 0, "telegram_ids": 1, "usernames": 1},
+            sort=[("job_id", pymongo.ASCENDING), ("last_id", pymongo.ASCENDING)], batch_size=1
+        )
+        async for document in find_cursor:
+            telegram_ids = _unpack(document["telegram_ids"])
+            usernames: list[str] | None = document.get("usernames")
+            start = 0 if after_id is None else bisect_right(telegram_ids, after_id)
+            stop = len(telegram_ids) if until_id is None else bisect_right(telegram_ids, until_id)
+            for offset in range(start, stop, page_size):
+                end = min(offset + page_size, stop)
+                yield [
+                    {"telegram_id": telegram_ids[i], "username": usernames[i] if usernames is not None else ""}
+                    for i in range(offset, end)
+                ]
+
+    async def delete(self, job_id: str) -> int:
+        delete_result = await self.__collection.delete_many({"job_id": job_id})
+        return delete_result.deleted_count
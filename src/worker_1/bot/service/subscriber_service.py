@@ -1,8 +1,17 @@
+import asyncio
 from dataclasses import dataclass
-from typing import Any
+from typing import Any, AsyncIterator
 from motor.motor_asyncio import AsyncIOMotorCollection
+import pymongo
+from pymongo import ReturnDocument
+from .counter_service import CounterService
+from .delivery_service import DELIVERY_COLLECTION
 from datetime import datetime
 
+COUNT_MODE_COUNTER = "counter"
+COUNT_MODE_EXACT = "exact"
+COUNT_MODE_ESTIMATED = "estimated"
+
 
 @dataclass
 class Subscriber:
@@ -29,8 +38,23 @@ class Subscriber:
 
 
 class SubscriberService:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    """
+    Notes:
+    - Status changes made through this service move the per-status counters of `counter_service`,
+      `get_count` reads them according to `count_mode`:
+        - "counter": the counter, O(1), falls back to counting when the counter was never set
+        - "exact": count_documents, walks the (status, telegram_id) index
+        - "estimated": estimated_document_count from the collection metadata, O(1) but counts every
+          subscriber whatever the status
+    """
+
+    def __init__(
+            self, collection: AsyncIOMotorCollection, counter_service: CounterService | None = None,
+            count_mode: str = COUNT_MODE_COUNTER
+    ):
         self.__collection = collection
+        self.__counter_service = counter_service
+        self.__count_mode = count_mode if counter_service is not None else COUNT_MODE_EXACT
 
     async def exists(self, subscriber_id: int, raise_exception: bool = False) -> bool:
         count: int = await self.__collection.count_documents({"telegram_id": subscriber_id})
@@ -46,30 +70,255 @@ class SubscriberService:
         )
         return await find_cursor.to_list(length=None)
 
+    async def iter_batches(self, target_status: str, batch_size: int) -> AsyncIterator[list[dict]]:
+        """
+        Stream subscribers of `target_status` from a single server-side cursor.
+
+        Yields:
+            list[dict]: up to `batch_size` subscribers, one batch per round trip to the DB
+        """
+        find_cursor = self.__collection.find({"status": target_status}, {"_id": 0}, batch_size=batch_size)
+        batch: list[dict] = list()
+        async for document in find_cursor:
+            batch.append(document)
+            if len(batch) >= batch_size:
+                yield batch
+                batch = list()
+        if len(batch) > 0:
+            yield batch
+
+    async def ensure_indexes(self) -> None:
+        # Serves keyset pagination in `iter_pages`, `get_all` and `get_count`
+        await self.__collection.create_index(
+            [("status", pymongo.ASCENDING), ("telegram_id", pymongo.ASCENDING)], name="status_telegram_id"
+        )
+        # Serves every lookup by subscriber, shared with the master bot
+        await self.__collection.create_index("telegram_id", name="telegram_id", unique=True)
+
+    async def __find_page(
+            self, target_status: str | None, after_id: int | None, limit: int, projection: dict,
+            undelivered_of: str | None, until_id: int | None
+    ) -> list[dict]:
+        query: dict = dict()
+        if target_status is not None:
+            query["status"] = target_status
+        id_range: dict = dict()
+        if after_id is not None:
+            id_range["$gt"] = after_id
+        if until_id is not None:
+            id_range["$lte"] = until_id
+        if len(id_range) > 0:
+            query["telegram_id"] = id_range
+        if undelivered_of is None:
+            find_cursor = self.__collection.find(
+                query, projection, sort=[("telegram_id", pymongo.ASCENDING)], limit=limit
+            )
+            return await find_cursor.to_list(length=None)
+        aggregate_cursor = self.__collection.aggregate([
+            {"$match": query},
+            {"$sort": {"telegram_id": pymongo.ASCENDING}},
+            *self.__undelivered_stages(undelivered_of),
+            {"$limit": limit},
+            {"$project": projection},
+        ])
+        return await aggregate_cursor.to_list(length=None)
+
+    @staticmethod
+    def __undelivered_stages(job_hash: str) -> list[dict]:
+        # Anti-join against the delivery collection, served by its (job_hash, telegram_id) index
+        return [
+            {"$lookup": {
+                "from": DELIVERY_COLLECTION,
+                "localField": "telegram_id",
+                "foreignField": "telegram_id",
+                "pipeline": [{"$match": {"job_hash": job_hash}}, {"$project": {"_id": 1}}],
+                "as": "_delivered",
+            }},
+            {"$match": {"_delivered": {"$size": 0}}},
+        ]
+
+    async def iter_pages(
+            self, target_status: str | None, page_size: int, fields: list[str] | None,
+            after_id: int | None = None, undelivered_of: str | None = None, until_id: int | None = None
+    ) -> AsyncIterator[list[dict]]:
+        """
+        Iterate subscribers of `target_status` page by page in ascending telegram_id.
+
+        Pages are fetched by keyset (telegram_id greater than the last one seen) on the
+        (status, telegram_id) index, so each page costs the same regardless of its position. The next page
+        is fetched while the caller works on the current one.
+
+        Args:
+            target_status (str | None): subscriber status to match, None for every subscriber
+            page_size (int): maximum number of subscribers per page
+            fields (list[str] | None): fields to return besides telegram_id, None for every field
+            after_id (int | None): resume after this telegram_id
+            undelivered_of (str | None): skip subscribers who already received this job, on the DB side
+            until_id (int | None): stop at this telegram_id, inclusive
+
+        Yields:
+            list[dict]: a non-empty page of subscribers
+        """
+        projection = {"_id": 0}
+        if fields is not None:
+            projection["telegram_id"] = 1
+            for field in fields:
+                projection[field] = 1
+        next_page = asyncio.ensure_future(
+            self.__find_page(target_status, after_id, page_size, projection, undelivered_of, until_id)
+        )
+        try:
+            while next_page is not None:
+                page = await next_page
+                next_page = None
+                if len(page) == 0:
+                    break
+                if len(page) == page_size:
+                    next_page = asyncio.ensure_future(self.__find_page(
+                        target_status, page[-1]["telegram_id"], page_size, projection, undelivered_of, until_id
+                    ))
+                yield page
+        finally:
+            if next_page is not None:
+                next_page.cancel()
+
     async def get_count(self, target_status: str) -> int:
+        if self.__count_mode == COUNT_MODE_ESTIMATED:
+            return await self.__collection.estimated_document_count()
+        if self.__count_mode == COUNT_MODE_COUNTER:
+            count = await self.__counter_service.get(target_status)
+            if count is not None:
+                return count
         return await self.__collection.count_documents({"status": target_status})
 
+    async def get_pending_count(self, target_status: str, undelivered_of: str) -> int:
+        """
+        Number of subscribers of `target_status` who did not receive the job `undelivered_of` yet, i.e. the
+        audience `iter_pages` walks with the same arguments.
+
+        Notes:
+        - Walks the (status, telegram_id) index and probes the delivery index once per subscriber, only the
+          count leaves the DB.
+        """
+        aggregate_cursor = self.__collection.aggregate([
+            {"$match": {"status": target_status}},
+            *self.__undelivered_stages(undelivered_of),
+            {"$count": "count"},
+        ])
+        documents = await aggregate_cursor.to_list(length=None)
+        if len(documents) == 0:
+            return 0
+        return documents[0]["count"]
+
+    async def count_by_status(self) -> dict[str, int]:
+        aggregate_cursor = self.__collection.aggregate([
+            {"$group": {"_id": "$status", "count": {"$sum": 1}}}
+        ])
+        return {document["_id"]: document["count"] async for document in aggregate_cursor}
+
+    async def reconcile_counters(self) -> dict[str, int]:
+        """
+        Reset the per-status counters from the subscriber collection.
+
+        Returns:
+            dict[str, int]: number of subscribers per status
+
+        Notes:
+        - Status changes made while the subscribers are being counted may be lost, the next reconciliation
+          corrects them.
+        """
+        counts = await self.count_by_status()
+        if self.__counter_service is not None:
+            await self.__counter_service.reset(counts)
+        return counts
+
+    async def __count_status_change(self, before: dict | None, key_value_pair: dict) -> None:
+        if self.__counter_service is None or before is None or "status" not in key_value_pair:
+            return None
+        old_status, new_status = before.get("status"), key_value_pair["status"]
+        if old_status == new_status:
+            return None
+        changes = {new_status: 1}
+        if old_status is not None:
+            changes[old_status] = -1
+        await self.__counter_service.increment(changes)
+
     async def set_attribute(
             self, sub_id: int, _key: str | None = None, _value: Any | None = None, **key_value_pair
     ) -> int:
-        await self.exists(sub_id, True)
         # TODO Detect invalid key
-        if _key is None or _value is None:
-            result = await self.__collection.update_one(
-                {'telegram_id': sub_id},
-                {'$set': key_value_pair}
-            )
-            return result.modified_count
-        else:
-            result = await self.__collection.update_one(
-                {'telegram_id': sub_id},
-                {'$set': {_key: _value}}
+        if _key is not None and _value is not None:
+            key_value_pair = {_key: _value}
+        # The document before the update tells whether the status changed
+        before = await self.__collection.find_one_and_update(
+            {'telegram_id': sub_id},
+            {'$set': key_value_pair},
+            projection={"_id": 0, **{key: 1 for key in key_value_pair}},
+            return_document=ReturnDocument.BEFORE
+        )
+        if before is None:
+            raise ValueError(f"{sub_id} does not exists")
+        await self.__count_status_change(before, key_value_pair)
+        return int(any(before.get(key) != value for key, value in key_value_pair.items()))
+
+    @staticmethod
+    def set_attribute_request(sub_id: int, **key_value_pair) -> pymongo.UpdateOne:
+        """
+        Build the write request of `set_attribute` for `bulk_write`.
+        """
+        if "status" in key_value_pair:
+            raise ValueError("Status changes must go through set_attribute to keep the counters right")
+        return pymongo.UpdateOne({'telegram_id': sub_id}, {'$set': key_value_pair})
+
+    @staticmethod
+    def insert_if_absent_request(document: dict) -> pymongo.UpdateOne:
+        """
+        Build a write request inserting the subscriber unless its telegram_id is already known.
+        """
+        return pymongo.UpdateOne(
+            {"telegram_id": document["telegram_id"]}, {"$setOnInsert": document}, upsert=True
+        )
+
+    async def bulk_insert_if_absent(self, documents: list[dict]) -> tuple[list[int], list[tuple[int, str]]]:
+        """
+        Insert the subscribers whose telegram_id is not known yet, with unordered `insert_if_absent_request`s.
+
+        Returns:
+            tuple[list[int], list[tuple[int, str]]]: positions of the documents that were inserted, and position
+            and error message of the documents that could not be written
+        """
+        if len(documents) == 0:
+            return list(), list()
+        failed: list[tuple[int, str]] = list()
+        try:
+            result = await self.__collection.bulk_write(
+                [self.insert_if_absent_request(document) for document in documents], ordered=False
             )
-            return result.modified_count
+            inserted = sorted(result.upserted_ids.keys())
+        except pymongo.errors.BulkWriteError as err:
+            inserted = sorted(upserted["index"] for upserted in err.details.get("upserted", []))
+            # Duplicate key: lost a race against a concurrent insert of the same telegram_id, i.e. skipped
+            failed = [
+                (write_error["index"], write_error.get("errmsg", ""))
+                for write_error in err.details.get("writeErrors", []) if write_error.get("code") != 11000
+            ]
+        if self.__counter_service is not None:
+            changes: dict[str, int] = dict()
+            for index in inserted:
+                status = documents[index].get("status")
+                changes[status] = changes.get(status, 0) + 1
+            await self.__counter_service.increment(changes)
+        return inserted, failed
 
-    async def clear_task_log(self, task_hash: str) -> int:
-        update_result = await self.__collection.update_many(filter={}, update={"$set": {task_hash: 0}})
-        return update_result.modified_count
+    async def bulk_write(self, requests: list) -> int:
+        if len(requests) == 0:
+            return 0
+        result = await self.__collection.bulk_write(requests, ordered=False)
+        return result.modified_count + result.upserted_count
+
+    @staticmethod
+    def unset_attribute_request(sub_id: int, *keys: str) -> pymongo.UpdateOne:
+        return pymongo.UpdateOne({'telegram_id': sub_id}, {'$unset': {key: "" for key in keys}})
 
     async def get_attribute(self, sub_id: int, key: str) -> Any | None:
         await self.exists(sub_id, True)
@@ -100,4 +349,10 @@ class SubscriberService:
         is_exists: bool = await self.exists(subscriber.tel_id, False)
         if is_exists:
             return None
-        await self.__collection.insert_one(subscriber.to_dict())
+        try:
+            await self.__collection.insert_one(subscriber.to_dict())
+        except pymongo.errors.DuplicateKeyError:
+            # Registered concurrently
+            return None
+        if self.__counter_service is not None:
+            await self.__counter_service.increment({subscriber.status: 1})
@@ -1,22 +1,51 @@
+import asyncio
+import time
 from motor.motor_asyncio import AsyncIOMotorCollection
 
 
 class SuperService:
-    def __init__(self, collection: AsyncIOMotorCollection):
+    """
+    Notes:
+    - The allow list is held in memory and reloaded once it is `refresh_seconds` old, `grant` and `revoke`
+      update it immediately. Changes made by another worker are seen after at most `refresh_seconds`.
+    """
+
+    def __init__(self, collection: AsyncIOMotorCollection, refresh_seconds: float = 30.0):
         self.__collection = collection
+        self.__refresh_seconds = refresh_seconds
+        self.__allowed: set[int] = set()
+        self.__loaded_at: float | None = None
+        self.__lock = asyncio.Lock()
+
+    async def refresh(self) -> None:
+        find_cursor = self.__collection.find({}, {"_id": 0, "telegram_id": 1})
+        self.__allowed = {document["telegram_id"] async for document in find_cursor}
+        self.__loaded_at = time.monotonic()
+
+    def __is_stale(self) -> bool:
+        return self.__loaded_at is None or time.monotonic() - self.__loaded_at >= self.__refresh_seconds
+
+    async def ensure_indexes(self) -> None:
+        await self.__collection.create_index("telegram_id", name="telegram_id", unique=True)
 
     async def not_in_allow_list(self, tel_id: int) -> bool:
-        count = await self.__collection.count_documents({"telegram_id": tel_id})
-        return count == 0
+        if self.__is_stale():
+            async with self.__lock:
+                # Concurrent callers wait for the reload of the first one
+                if self.__is_stale():
+                    await self.refresh()
+        return tel_id not in self.__allowed
 
     async def grant(self, tel_id: int, username: str) -> None:
         await self.__collection.insert_one({
             "telegram_id": tel_id,
             "username": username
         })
+        self.__allowed.add(tel_id)
 
     async def revoke(self, tel_id: int) -> int:
         update_result = await self.__collection.delete_one({"telegram_id": tel_id})
+        self.__allowed.discard(tel_id)
         return update_result.deleted_count
     
     async def count(self) -> int:
@@ -0,0 +1,161 @@
+import ast
+import csv
+import gzip
+import json
+from dataclasses import dataclass
+from typing import IO, Iterator
+
+import service
+from const import MODE_SUBSCRIBED, STATUS_ACTIVE, STATUS_INACTIVE
+from my_functions import HASHCODE_PATTERN, create_subscriber
+
+STANDARD_COLUMNS = [
+    "telegram_id", "chat_id", "username", "mode", "status", "n_feedback", "feedback", "reg_datetime"
+]
+INT_COLUMNS = ["telegram_id", "chat_id", "n_feedback"]
+
+
+@dataclass
+class ImportRow:
+    """
+    A validated subscriber row, ready to be written.
+    """
+    line_no: int
+    document: dict  # standard and non-standard columns, hash columns excluded
+    delivered: list[str]  # job hashes the subscriber already received
+
+
+def open_subscriber_list(path: str) -> IO[str]:
+    """
+    Open a subscriber list as text, gzip is detected by the ".gz" extension.
+    """
+    if path.endswith(".gz"):
+        return gzip.open(path, "rt", encoding="utf-8")
+    return open(path, "r", encoding="utf-8")
+
+
+def is_csv(path: str) -> bool:
+    return path.removesuffix(".gz").lower().endswith(".csv")
+
+
+def parse_line(line: str) -> dict:
+    """
+    Parse one NDJSON line, or one line of the legacy export which holds the repr of a Python dict.
+
+    Raises:
+        ValueError: If the line is neither
+    """
+    try:
+        row = json.loads(line)
+    except json.JSONDecodeError:
+        try:
+            row = ast.literal_eval(line)
+        except (ValueError, SyntaxError):
+            raise ValueError("Unreadable line")
+    if not isinstance(row, dict):
+        raise ValueError("Line is not an object")
+    return row
+
+
+def validate_row(row: dict, line_no: int) -> ImportRow:
+    """
+    Check and normalize one subscriber row.
+
+    Notes:
+        - CSV values arrive as strings, integer columns are converted. Empty CSV cells count as missing.
+        - A missing status or mode defaults to an active, subscribed subscriber.
+        - Hash columns (legacy delivery markers) set to 1 become deliveries, other values are dropped.
+
+    Raises:
+        ValueError: If telegram_id is missing or a column holds an invalid value
+    """
+    for column in INT_COLUMNS:
+        if column in row and row[column] is not None and not isinstance(row[column], int):
+            try:
+                row[column] = int(row[column])
+            except (TypeError, ValueError):
+                raise ValueError(f"{column} is not an integer: {row[column]}")
+    if row.get("telegram_id") is None:
+        raise ValueError("telegram_id is missing")
+    if row.get("status") is None:
+        row["status"] = STATUS_ACTIVE
+    if row["status"] not in [STATUS_ACTIVE, STATUS_INACTIVE]:
+        raise ValueError(f"Invalid status: {row['status']}")
+    if row.get("mode") is None:
+        row["mode"] = MODE_SUBSCRIBED
+    document: dict = create_subscriber(row).to_dict()
+    delivered: list[str] = list()
+    for column, value in row.items():
+        if column in STANDARD_COLUMNS:
+            continue
+        if HASHCODE_PATTERN.match(column):
+            if str(value) == "1":
+                delivered.append(column)
+            continue
+        document[column] = value
+    return ImportRow(line_no, document, delivered)
+
+
+def iter_import_chunks(path: str, chunk_size: int) -> Iterator[tuple[list[ImportRow], list[tuple[int, str]]]]:
+    """
+    Read, parse and validate a subscriber list chunk by chunk.
+
+    The format is picked by extension: ".csv" (with a header row) or else one object per line, either NDJSON
+    or the legacy export, both optionally gzipped. Blank lines are ignored.
+
+    Yields:
+        tuple[list[ImportRow], list[tuple[int, str]]]: valid rows and (line number, reason) of the invalid
+        rows of each chunk
+
+    Notes:
+        - Blocking, meant to be advanced from a worker thread.
+    """
+    with open_subscriber_list(path) as file:
+        if is_csv(path):
+            reader = csv.DictReader(file)
+            rows: Iterator[tuple[int, dict | str]] = (
+                (reader.line_num, {key: value for key, value in row.items() if key is not None and value != ""})
+                for row in reader
+            )
+        else:
+            rows = ((line_no, line.strip()) for line_no, line in enumerate(file, start=1) if line.strip())
+        valid, invalid = list(), list()
+        for line_no, row in rows:
+            try:
+                valid.append(validate_row(row if isinstance(row, dict) else parse_line(row), line_no))
+            except ValueError as err:
+                invalid.append((line_no, str(err)))
+            if len(valid) + len(invalid) >= chunk_size:
+                yield valid, invalid
+                valid, invalid = list(), list()
+        if len(valid) + len(invalid) > 0:
+            yield valid, invalid
+
+
+async def write_import_rows(
+        ss: service.subscriber_service.SubscriberService,
+        ds: service.delivery_service.DeliveryService,
+        rows: list[ImportRow]
+) -> tuple[int, list[tuple[int, str]]]:
+    """
+    Insert the subscribers of a chunk that are not known yet, with one unordered bulk write, then record the
+    deliveries of the inserted ones.
+
+    Returns:
+        tuple[int, list[tuple[int, str]]]: number of subscribers inserted, and (line number, reason) of the rows
+        the DB rejected, the others were skipped
+
+    Notes:
+        - Known subscribers are left untouched, as are repeated telegram_ids within the chunk.
+    """
+    unique_rows: dict[int, ImportRow] = dict()
+    for row in rows:
+        unique_rows.setdefault(row.document["telegram_id"], row)
+    pending = list(unique_rows.values())
+    inserted, failed = await ss.bulk_insert_if_absent([row.document for row in pending])
+    delivery_requests = [
+        ds.mark_request(job_hash, pending[index].document["telegram_id"])
+        for index in inserted for job_hash in pending[index].delivered
+    ]
+    await ds.bulk_write(delivery_requests)
+    return len(inserted), [(pending[index].line_no, f"Write failed: {reason}") for index, reason in failed]
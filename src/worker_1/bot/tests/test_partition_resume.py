@@ -0,0 +1,59 @@
+import asyncio
+
+from const import STATUS_ACTIVE, STATUS_INACTIVE
+from my_functions import skip_delivered
+from service import ServiceFactory, STORAGE_MEMORY
+from service.partition_service import PartitionService
+from service.snapshot_service import split_points
+
+JOB_HASH = "0123456789abcdef0123456789abcdef"
+PAGE_SIZE = 10
+
+
+async def resume_with_flushed_markers() -> tuple[list[int], list[int], set[int]]:
+    sf = ServiceFactory("", 1, "test", storage_backend=STORAGE_MEMORY, snapshot_chunk_size=25)
+    await sf.ensure_indexes()
+    subscriber_service = sf.get_service("subscriber")
+    delivery_service = sf.get_service("delivery")
+    snapshot_service = sf.get_service("job_snapshot")
+    partition_service: PartitionService = sf.get_service("job_partition")
+    await subscriber_service.bulk_insert_if_absent([
+        {"telegram_id": telegram_id, "username": f"user{telegram_id}",
+         "status": STATUS_INACTIVE if telegram_id % 7 == 0 else STATUS_ACTIVE}
+        for telegram_id in range(1, 101)
+    ])
+    telegram_ids = await snapshot_service.create(
+        "job", subscriber_service.iter_pages(STATUS_ACTIVE, PAGE_SIZE, [], undelivered_of=JOB_HASH), False
+    )
+    await partition_service.create("job", split_points(telegram_ids, 1))
+    partition = await partition_service.claim("worker", 60)
+    # First run: the first page is checkpointed, the markers of half of the second page were flushed by the
+    # writer's timer before the worker died
+    first_page, second_page = [
+        page async for page in snapshot_service.iter_pages("job", PAGE_SIZE, after_id=partition.after_id)
+    ][:2]
+    flushed = {subscriber["telegram_id"] for subscriber in first_page + second_page[:PAGE_SIZE // 2]}
+    await delivery_service.bulk_write([
+        delivery_service.mark_request(JOB_HASH, telegram_id) for telegram_id in flushed
+    ])
+    partition.cursor = first_page[-1]["telegram_id"]
+    assert await partition_service.checkpoint(partition, 60)
+    # The restarted worker takes its partition back and resumes from the cursor
+    resumed = await partition_service.claim("worker", 60)
+    sent: list[int] = [
+        subscriber["telegram_id"]
+        async for page in skip_delivered(
+            delivery_service,
+            snapshot_service.iter_pages("job", PAGE_SIZE, after_id=resumed.after_id, until_id=resumed.upper_id),
+            JOB_HASH
+        )
+        for subscriber in page
+    ]
+    return list(telegram_ids), sent, flushed
+
+
+def test_resumed_partition_skips_flushed_markers():
+    audience, sent, flushed = asyncio.run(resume_with_flushed_markers())
+    assert len(flushed & set(sent)) == 0
+    assert sorted(flushed | set(sent)) == audience
+    assert sent == sorted(sent)